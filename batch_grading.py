@@ -0,0 +1,200 @@
+import os
+import sys
+import csv
+import json
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from question import Question, QuestionManager
+from storage import open_storage
+from grading import GRADERS
+
+
+# Set in each worker process by load_worker_bank
+worker_questions = None
+worker_grader = None
+
+
+def load_worker_bank(file_path, grader):
+    """
+    Process pool initializer: loads the question bank once per worker, read-only.
+
+    Workers never repair the change log, write the snapshot cache or map a
+    columnar bank writable; the parent process owns the bank.
+    """
+    global worker_questions, worker_grader
+    storage = open_storage(file_path, os.devnull, read_only=True)
+    worker_questions = {question.question_id: question for question in storage.load_questions(Question)}
+    storage.close()
+    worker_grader = grader
+
+
+def grade_chunk(records, questions=None, grader=None):
+    """
+    Grades (user, question_id, answer) records against a bank.
+
+    Returns (user -> [correct, answered], question_id -> [shown, correct],
+    number of records with an unknown question ID). Runs in a worker, where
+    the bank and grader come from load_worker_bank, or in-process with
+    both passed in.
+    """
+    questions = worker_questions if questions is None else questions
+    grader = worker_grader if grader is None else grader
+    user_scores = {}
+    question_counts = {}
+    unknown = 0
+    for user, question_id, user_answer in records:
+        try:
+            question = questions.get(int(question_id))
+        except (TypeError, ValueError):
+            question = None
+        if question is None:
+            unknown += 1
+            continue
+        correct = grader.grade(question, user_answer)
+        score = user_scores.get(user)
+        if score is None:
+            score = user_scores[user] = [0, 0]
+        score[0] += correct
+        score[1] += 1
+        counts = question_counts.get(question.question_id)
+        if counts is None:
+            counts = question_counts[question.question_id] = [0, 0]
+        counts[0] += 1
+        counts[1] += correct
+    return user_scores, question_counts, unknown
+
+
+def merge_counts(total, part):
+    """
+    Adds the [a, b] counters of part into total.
+    """
+    for key, (first, second) in part.items():
+        counts = total.get(key)
+        if counts is None:
+            total[key] = [first, second]
+        else:
+            counts[0] += first
+            counts[1] += second
+
+
+def chunks(records, chunk_size):
+    """
+    Splits a stream of records into lists of chunk_size records.
+    """
+    records = iter(records)
+    while True:
+        chunk = list(itertools.islice(records, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def grade_submissions(question_manager, records, workers=None, chunk_size=20000, update_statistics=False):
+    """
+    Grades a stream of (user, question_id, answer) records with the manager's grader.
+
+    With more than one worker the records are sharded in chunks over a
+    process pool; each worker loads the bank from the manager's file once,
+    so save the bank before regrading an edited answer key. Only a few
+    chunks per worker are in flight at a time, so the input can be larger
+    than memory. Partial results are merged in the parent. With
+    update_statistics the per-question counts are then added to the bank
+    and saved in one step.
+
+    Returns (user -> (correct, answered), question_id -> (shown, correct), unknown records).
+    """
+    workers = os.cpu_count() if workers is None else workers
+    user_scores = {}
+    question_counts = {}
+    unknown = 0
+
+    def merge(result):
+        nonlocal unknown
+        merge_counts(user_scores, result[0])
+        merge_counts(question_counts, result[1])
+        unknown += result[2]
+
+    if workers <= 1:
+        questions = {question.question_id: question for question in question_manager.questions}
+        for chunk in chunks(records, chunk_size):
+            merge(grade_chunk(chunk, questions, question_manager.grader))
+    else:
+        with ProcessPoolExecutor(workers, initializer=load_worker_bank,
+                                 initargs=(question_manager.file_path, question_manager.grader)) as executor:
+            pending = set()
+            for chunk in chunks(records, chunk_size):
+                if len(pending) >= 2 * workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        merge(future.result())
+                pending.add(executor.submit(grade_chunk, chunk))
+            for future in pending:
+                merge(future.result())
+
+    if update_statistics:
+        for question_id, (shown, correct) in question_counts.items():
+            question = question_manager.get_question_by_id(question_id)
+            if question is not None:
+                question.shown_count += shown
+                question.correct_count += correct
+        question_manager.save_statistics()
+
+    return ({user: tuple(score) for user, score in user_scores.items()},
+            {question_id: tuple(counts) for question_id, counts in question_counts.items()},
+            unknown)
+
+
+def read_submissions(file_path):
+    """
+    Streams (user, question_id, answer) records from a CSV file with those columns, or from JSON Lines.
+    """
+    with open(file_path, 'r', newline='', encoding='utf-8') as file:
+        if file_path.endswith(".csv"):
+            for row in csv.DictReader(file):
+                yield row["user"], row["question_id"], row["answer"]
+        else:
+            for line in file:
+                if line.strip():
+                    record = json.loads(line)
+                    yield record["user"], record["question_id"], record["answer"]
+
+
+def write_scores(file_path, user_scores):
+    """
+    Writes one user,correct,answered,percentage line per user.
+    """
+    with open(file_path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(["user", "correct", "answered", "percentage"])
+        for user in sorted(user_scores):
+            correct, answered = user_scores[user]
+            writer.writerow([user, correct, answered, f"{correct / answered * 100:.2f}"])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Regrade submitted answers in bulk on all CPU cores.")
+    parser.add_argument("submissions", help="CSV (user,question_id,answer) or JSONL file of answers")
+    parser.add_argument("--bank", default="questions.txt", help="question bank with the answer key")
+    parser.add_argument("--statistics", default="statistics.txt", help="statistics file of a text bank")
+    parser.add_argument("--grading", choices=sorted(GRADERS), default="exact")
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per CPU)")
+    parser.add_argument("--scores", default="scores.csv", help="where to write the per-user scores")
+    parser.add_argument("--update-statistics", action="store_true", help="add the results to the question statistics")
+    args = parser.parse_args(argv)
+
+    question_manager = QuestionManager(args.bank, args.statistics, grading=args.grading)
+    user_scores, question_counts, unknown = grade_submissions(
+        question_manager, read_submissions(args.submissions), args.workers, update_statistics=args.update_statistics)
+    question_manager.storage.close()
+    write_scores(args.scores, user_scores)
+    answered = sum(shown for shown, _ in question_counts.values())
+    print(f"Graded {answered} answers from {len(user_scores)} users; scores written to {args.scores}.")
+    if unknown:
+        print(f"Skipped {unknown} answers to unknown questions.", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,176 @@
+import io
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import contextlib
+from unittest import mock
+
+from question import QuestionManager
+from practice_test import PracticeMode, TestMode
+from results_log import ResultsLog
+from grading import FuzzyGrader
+
+
+DEFAULT_SIZES = (1000, 100000)
+
+
+def write_synthetic_bank(directory, size, seed=0):
+    """
+    Writes a questions file and a statistics file with `size` questions.
+
+    Every other question is a quiz question; a third of the free-form
+    answers are numbers so both answer matchers are exercised. Returns the
+    paths of the two files.
+    """
+    rng = random.Random(seed)
+    questions_path = os.path.join(directory, f"questions_{size}.txt")
+    statistics_path = os.path.join(directory, f"statistics_{size}.txt")
+    with open(questions_path, 'w') as questions_file, open(statistics_path, 'w') as statistics_file:
+        for question_id in range(1, size + 1):
+            text = f"Synthetic question {question_id} about topic {rng.randrange(100)}"
+            if question_id % 2 == 0:
+                options = [f"option {question_id}-{index}" for index in range(3)]
+                answer = options[rng.randrange(3)]
+                questions_file.write(f"{question_id}|True|{text}|{','.join(options)}|{answer}|QuizQuestion\n")
+            elif question_id % 3 == 0:
+                questions_file.write(f"{question_id}|True|{text}|{question_id * 7}|FreeformQuestion\n")
+            else:
+                questions_file.write(f"{question_id}|True|{text}|Answer {question_id}|FreeformQuestion\n")
+            shown = rng.randrange(20)
+            correct = rng.randint(0, shown)
+            percentage = round(correct / shown * 100, 2) if shown else 0
+            statistics_file.write(f"{question_id}|True|{text}|{shown}|{correct}|{percentage}|{0.8 ** correct:.6f}|\n")
+    return questions_path, statistics_path
+
+
+def scripted_input(answers):
+    """
+    Replaces input() with the given answers while the modes run, and discards their output.
+    """
+    stack = contextlib.ExitStack()
+    stack.enter_context(mock.patch("builtins.input", side_effect=list(answers)))
+    stack.enter_context(contextlib.redirect_stdout(io.StringIO()))
+    return stack
+
+
+def measure(results, size, name, operations, function):
+    """
+    Runs function once and records its duration and throughput.
+    """
+    started = time.perf_counter()
+    function()
+    seconds = time.perf_counter() - started
+    results.append({
+        "size": size,
+        "benchmark": name,
+        "operations": operations,
+        "seconds": round(seconds, 6),
+        "ops_per_second": round(operations / seconds, 1) if seconds > 0 else None,
+    })
+
+
+def benchmark_bank(size, directory, draws=100000, answers=2000, seed=0):
+    """
+    Runs every benchmark against one synthetic bank and returns the result records.
+    """
+    results = []
+    random.seed(seed)
+    questions_path, statistics_path = write_synthetic_bank(directory, size, seed)
+
+    holder = {}
+    measure(results, size, "startup", 1, lambda: holder.setdefault("manager", QuestionManager(questions_path, statistics_path)))
+    manager = holder["manager"]
+    measure(results, size, "load_questions", size, manager.load_questions)
+    measure(results, size, "load_statistics", size, manager.statistics_view.load_statistics)
+
+    practice_mode = PracticeMode(manager)
+
+    def draw():
+        for _ in range(draws):
+            practice_mode.get_random_question()
+    measure(results, size, "get_random_question", draws, draw)
+
+    # A full practice session: every answer goes through grading, the scheduler and the storage.
+    with scripted_input(["1"] * answers + ["q"]):
+        measure(results, size, "practice_answer", answers, practice_mode.practice_mode)
+
+    free_form = [question for question in manager.questions[:answers] if question.is_free_form()]
+    attempts = [(question, candidate) for question in free_form for candidate in (question.answer, " wrong ", question.answer.upper())]
+
+    def compare():
+        for question, candidate in attempts:
+            question.compare_answers(candidate)
+    measure(results, size, "compare_answers", len(attempts), compare)
+
+    grader = FuzzyGrader()
+
+    def fuzzy_grade():
+        for _ in range(3):  # Repeats of the same answers are served from the cache
+            for question, candidate in attempts:
+                grader.grade(question, candidate)
+    measure(results, size, "fuzzy_grade", 3 * len(attempts), fuzzy_grade)
+
+    test_mode = TestMode(manager, ResultsLog(os.path.join(directory, f"results_{size}.jsonl")))
+    tests = min(100, manager.enabled_count // 10)
+    measure(results, size, "generate_tests", tests, lambda: test_mode.generate_tests(tests, 10, seed=seed))
+
+    # Unchanged files are not rewritten, and practice mode has already saved the statistics;
+    # change the questions and every question's statistics so both saves really write.
+    first = manager.questions[0]
+    manager.set_question_enabled(first, not first.enabled)
+    measure(results, size, "save_questions", size, manager.save_questions)
+    for question in manager.questions:
+        question.shown_count += 1
+    measure(results, size, "save_statistics", size, manager.statistics_view.save_statistics)
+    manager.storage.close()
+    return results
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, draws=100000, answers=2000, seed=0):
+    """
+    Benchmarks each bank size in a scratch directory and returns a JSON-serializable report.
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            results.extend(benchmark_bank(size, directory, draws, answers, seed))
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "timestamp": time.time(),
+        "seed": seed,
+        "results": results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark question loading, selection, grading and saving on synthetic banks.")
+    parser.add_argument("--sizes", default=",".join(str(size) for size in DEFAULT_SIZES),
+                        help="comma-separated bank sizes, e.g. 1000,100000,1000000")
+    parser.add_argument("--draws", type=int, default=100000, help="questions drawn in the selection benchmark")
+    parser.add_argument("--answers", type=int, default=2000, help="scripted answers in the practice benchmark")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    report = run_benchmarks(sizes, args.draws, args.answers, args.seed)
+    for result in report["results"]:
+        print(f"{result['size']:>9} {result['benchmark']:<20} {result['seconds']:>10.4f}s {result['ops_per_second'] or 0:>14,.0f}/s", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,259 @@
+import os
+import re
+import gc
+import sys
+import csv
+import json
+import argparse
+
+from question import Question, QuestionManager
+from storage import QUESTION_TYPES
+
+
+CSV_FIELDS = ["id", "question", "answer", "options", "enabled", "tags"]
+SEPARATORS = re.compile(r"[|\r\n]")           # Would break a line of the questions file
+OPTION_SEPARATORS = re.compile(r"[|,\r\n]")   # Options and tags are also joined with commas
+
+
+class InvalidRecordsError(ValueError):
+    """
+    Raised when an import file has invalid records; lists every problem with its record number.
+    """
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__(f"{len(errors)} invalid record(s): " + "; ".join(errors[:10]))
+
+
+def detect_format(file_path, file_format=None):
+    """
+    Returns "csv" or "jsonl", from the explicit format or the file extension.
+    """
+    file_format = file_format or os.path.splitext(file_path)[1].lstrip(".").lower()
+    if file_format in ("json", "ndjson"):
+        file_format = "jsonl"
+    if file_format not in ("csv", "jsonl"):
+        raise ValueError(f"Unknown import/export format: {file_format!r} (use csv or jsonl)")
+    return file_format
+
+
+def read_records(file_path, file_format=None):
+    """
+    Streams (record number, record, error) tuples from a CSV or JSONL file.
+
+    CSV files need a header with at least "question" and "answer"; quiz
+    options and tags go in comma-separated "options" and "tags" columns.
+    JSONL records use the same keys with options and tags as lists. Records that cannot be read at
+    all come with an error message instead.
+    """
+    file_format = detect_format(file_path, file_format)
+    with open(file_path, 'r', newline='', encoding='utf-8') as file:
+        if file_format == "csv":
+            reader = csv.reader(file)
+            header = next(reader, [])
+            for number, row in enumerate(reader, 1):
+                record = dict(zip(header, row))
+                for key in ("options", "tags"):
+                    value = record.get(key)
+                    record[key] = value.split(",") if value else []
+                yield number, record, None
+        else:
+            for number, line in enumerate(file, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError as error:
+                    yield number, None, f"invalid JSON: {error}"
+                    continue
+                if not isinstance(record, dict):
+                    yield number, None, "expected a JSON object"
+                    continue
+                for key in ("options", "tags"):
+                    if record.get(key) is None:
+                        record[key] = []
+                yield number, record, None
+
+
+ENABLED_FLAGS = {
+    None: True, "": True, True: True, False: False,
+    "true": True, "1": True, "yes": True, "false": False, "0": False, "no": False,
+}
+
+
+def parse_enabled(value):
+    """
+    Reads an enabled flag; missing means enabled. Returns None for anything unrecognized.
+    """
+    if isinstance(value, str):
+        value = value.strip().lower()
+    elif not isinstance(value, bool) and value is not None:
+        return None
+    return ENABLED_FLAGS.get(value)
+
+
+def check_field(name, value, separators=SEPARATORS):
+    """
+    Returns what is wrong with a text field, or None if the question files can hold it.
+    """
+    if not isinstance(value, str) or not value.strip():
+        return f"{name} is missing"
+    if separators.search(value):
+        return f"{name} contains a separator ({separators.pattern})"
+    return None
+
+
+def check_tag(tag):
+    """
+    Returns what is wrong with a tag, or None if it is fine.
+    """
+    problem = check_field("tag", tag, OPTION_SEPARATORS)
+    if problem is None and tag.strip() in QUESTION_TYPES:
+        return f"tag {tag.strip()} is a question type name"
+    return problem
+
+
+def is_valid(question_text, answer, options, tags, enabled):
+    """
+    Quick check that lets valid records skip the detailed checks of record_errors.
+    """
+    return (type(question_text) is str and type(answer) is str and type(options) is list and type(tags) is list
+            and enabled is not None and question_text.strip() and answer.strip()
+            and not SEPARATORS.search(question_text) and not SEPARATORS.search(answer)
+            and all(type(option) is str and option.strip() and not OPTION_SEPARATORS.search(option) for option in options)
+            and all(type(tag) is str and tag.strip() and not OPTION_SEPARATORS.search(tag) and tag.strip() not in QUESTION_TYPES for tag in tags))
+
+
+def record_errors(record, enabled):
+    """
+    Returns the problems of one record, or an empty list if it is valid.
+    """
+    options = record.get("options")
+    tags = record.get("tags")
+    if not isinstance(options, list):
+        return ["options must be a list"]
+    if not isinstance(tags, list):
+        return ["tags must be a list"]
+    problems = [check_field("question", record.get("question")), check_field("answer", record.get("answer"))]
+    problems.extend(check_field("option", option, OPTION_SEPARATORS) for option in options)
+    problems.extend(check_tag(tag) for tag in tags)
+    if enabled is None:
+        problems.append(f"enabled must be true or false, not {record.get('enabled')!r}")
+    return [problem for problem in problems if problem is not None]
+
+
+def build_questions(records, question_class):
+    """
+    Validates the records in one pass and creates their questions.
+
+    Raises InvalidRecordsError listing every invalid record; nothing is created
+    for the caller to add in that case.
+    """
+    questions = []
+    errors = []
+    for number, record, error in records:
+        if error is not None:
+            errors.append(f"record {number}: {error}")
+            continue
+        question_text = record.get("question")
+        answer = record.get("answer")
+        options = record.get("options")
+        tags = record.get("tags")
+        enabled = parse_enabled(record.get("enabled"))
+        if not is_valid(question_text, answer, options, tags, enabled):
+            errors.extend(f"record {number}: {problem}" for problem in record_errors(record, enabled))
+            continue
+
+        question = question_class(is_quiz=bool(options))
+        question.question_text = question_text
+        question.answer = answer
+        question.enabled = enabled
+        if tags:
+            question.tags = tags
+        if options:
+            question.answer_options = options
+            if question.correct_option_index is None:
+                errors.append(f"record {number}: answer {answer!r} is not one of the options")
+                continue
+        questions.append(question)
+
+    if errors:
+        raise InvalidRecordsError(errors)
+    return questions
+
+
+def import_questions(question_manager, file_path, file_format=None):
+    """
+    Imports every question of a CSV or JSONL file into the bank in one batch.
+
+    The file is validated completely before anything is added, and the
+    bank is written once. Returns the number of imported questions.
+    """
+    next_id = Question.next_id
+    gc_enabled = gc.isenabled()
+    gc.disable()  # Nothing here creates reference cycles; collecting while allocating millions of objects only costs time
+    try:
+        questions = build_questions(read_records(file_path, file_format), question_manager.question_class)
+    finally:
+        Question.next_id = next_id  # IDs are assigned when the batch is added
+        if gc_enabled:
+            gc.enable()
+    question_manager.add_questions(questions)
+    return len(questions)
+
+
+def export_questions(question_manager, file_path, file_format=None, batch_size=10000):
+    """
+    Streams every question of the bank to a CSV or JSONL file, batch_size lines at a time.
+
+    Returns the number of exported questions.
+    """
+    file_format = detect_format(file_path, file_format)
+    questions = question_manager.questions
+    with open(file_path, 'w', newline='', encoding='utf-8') as file:
+        if file_format == "csv":
+            writer = csv.writer(file)
+            writer.writerow(CSV_FIELDS)
+            for start in range(0, len(questions), batch_size):
+                writer.writerows(
+                    (question.question_id, question.question_text, question.answer, ",".join(question.answer_options), question.enabled,
+                     ",".join(question.tags))
+                    for question in questions[start:start + batch_size])
+        else:
+            for start in range(0, len(questions), batch_size):
+                file.write("".join(
+                    json.dumps({"id": question.question_id, "question": question.question_text, "answer": question.answer,
+                                "options": list(question.answer_options), "enabled": question.enabled,
+                                "tags": list(question.tags)}) + "\n"
+                    for question in questions[start:start + batch_size]))
+    return len(questions)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import or export a question bank as CSV or JSON Lines.")
+    parser.add_argument("command", choices=["import", "export"])
+    parser.add_argument("file", help="CSV or JSONL file to read or write")
+    parser.add_argument("--bank", default="questions.txt", help="question bank to import into or export from")
+    parser.add_argument("--statistics", default="statistics.txt", help="statistics file of a text bank")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="file format (default: from the file extension)")
+    args = parser.parse_args(argv)
+
+    question_manager = QuestionManager(args.bank, args.statistics)
+    try:
+        if args.command == "import":
+            count = import_questions(question_manager, args.file, args.format)
+            print(f"Imported {count} questions into {args.bank}.")
+        else:
+            count = export_questions(question_manager, args.file, args.format)
+            print(f"Exported {count} questions to {args.file}.")
+    except InvalidRecordsError as error:
+        for message in error.errors:
+            print(message, file=sys.stderr)
+        return 1
+    finally:
+        question_manager.storage.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
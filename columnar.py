@@ -0,0 +1,476 @@
+import os
+import sys
+import math
+import mmap
+import array
+import struct
+from collections import OrderedDict
+
+from persistence import atomic_open
+
+
+MAGIC = b"ILTQ"
+VERSION = 4
+HEADER = struct.Struct("=4sBBxxQQQQ")  # magic, version, big-endian flag, questions, options, tags, strings
+
+FLAG_ENABLED = 1
+FLAG_QUIZ = 2
+NEVER_SEEN = float("nan")
+
+# Fixed-width per-question columns in file order: (name, array typecode)
+QUESTION_COLUMNS = [
+    ("question_id", "q"),
+    ("weight", "d"),
+    ("shown_count", "q"),
+    ("correct_count", "q"),
+    ("last_seen", "d"),  # NaN when never shown
+    ("text_ref", "I"),
+    ("answer_ref", "I"),
+    ("flags", "B"),
+    ("box", "B"),  # Leitner box
+]
+
+
+def align(offset):
+    """
+    Rounds an offset up to the next multiple of 8 so every column can be cast in place.
+    """
+    return (offset + 7) & ~7
+
+
+def column_layout(question_count, option_count, tag_count, string_count):
+    """
+    Returns (name, typecode, length, offset) for every column and the offset of the string data.
+    """
+    lengths = [(name, typecode, question_count) for name, typecode in QUESTION_COLUMNS]
+    lengths.append(("option_start", "I", question_count + 1))
+    lengths.append(("option_ref", "I", option_count))
+    lengths.append(("tag_start", "I", question_count + 1))
+    lengths.append(("tag_ref", "I", tag_count))
+    lengths.append(("string_offset", "Q", string_count + 1))
+
+    layout = []
+    offset = align(HEADER.size)
+    for name, typecode, length in lengths:
+        layout.append((name, typecode, length, offset))
+        offset = align(offset + length * array.array(typecode).itemsize)
+    return layout, offset
+
+
+def write_bank(file_path, questions, before_replace=None):
+    """
+    Writes questions and their statistics as a columnar bank file.
+
+    Strings (question text, answers, options and tags) are interned in a
+    shared string table, so repeated options and tags are stored once. The file is written
+    next to the target and renamed over it. before_replace is called once
+    every question has been read, so lazy questions can still load from the
+    old file until then.
+    """
+    columns = {name: array.array(typecode) for name, typecode in QUESTION_COLUMNS}
+    option_start = array.array("I", [0])
+    option_ref = array.array("I")
+    tag_start = array.array("I", [0])
+    tag_ref = array.array("I")
+    string_ids = {}
+    strings = []
+
+    def intern(value):
+        string_id = string_ids.get(value)
+        if string_id is None:
+            string_id = string_ids[value] = len(strings)
+            strings.append(value.encode("utf-8"))
+        return string_id
+
+    for question in questions:
+        columns["question_id"].append(question.question_id)
+        columns["weight"].append(question.weight)
+        columns["shown_count"].append(question.shown_count)
+        columns["correct_count"].append(question.correct_count)
+        columns["last_seen"].append(NEVER_SEEN if question.last_seen is None else question.last_seen)
+        columns["box"].append(question.box)
+        columns["text_ref"].append(intern(question.question_text))
+        columns["answer_ref"].append(intern(question.answer))
+        columns["flags"].append((FLAG_ENABLED if question.enabled else 0) | (FLAG_QUIZ if question.is_quiz else 0))
+        for option in question.answer_options:
+            option_ref.append(intern(option))
+        option_start.append(len(option_ref))
+        for tag in question.tags:
+            tag_ref.append(intern(tag))
+        tag_start.append(len(tag_ref))
+
+    string_offset = array.array("Q", [0])
+    for value in strings:
+        string_offset.append(string_offset[-1] + len(value))
+
+    columns["option_start"] = option_start
+    columns["option_ref"] = option_ref
+    columns["tag_start"] = tag_start
+    columns["tag_ref"] = tag_ref
+    columns["string_offset"] = string_offset
+    layout, data_offset = column_layout(len(columns["question_id"]), len(option_ref), len(tag_ref), len(strings))
+
+    if before_replace is not None:
+        before_replace()
+    with atomic_open(file_path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION, sys.byteorder == "big", len(columns["question_id"]), len(option_ref), len(tag_ref), len(strings)))
+        for name, typecode, length, offset in layout:
+            file.write(b"\0" * (offset - file.tell()))
+            columns[name].tofile(file)
+        file.write(b"\0" * (data_offset - file.tell()))
+        for value in strings:
+            file.write(value)
+
+
+class ColumnarBank:
+    """
+    Memory-mapped view of a columnar bank file.
+
+    Opening a bank only reads the header; columns are accessed in place and
+    strings are decoded when a row is materialized.
+    """
+
+    def __init__(self, file_path, writable=False):
+        self.file_path = file_path
+        with open(file_path, "r+b" if writable else "rb") as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+        self.buffer = memoryview(self.map)
+        magic, version, big_endian, question_count, option_count, tag_count, string_count = HEADER.unpack_from(self.buffer)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{file_path} is not a question bank file.")
+        if big_endian != (sys.byteorder == "big"):
+            self.close()
+            raise ValueError(f"{file_path} was written on a machine with a different byte order.")
+
+        self.question_count = question_count
+        layout, self.data_offset = column_layout(question_count, option_count, tag_count, string_count)
+        self.columns = {}
+        for name, typecode, length, offset in layout:
+            size = length * array.array(typecode).itemsize
+            self.columns[name] = self.buffer[offset:offset + size].cast(typecode)
+
+
+    def __len__(self):
+        return self.question_count
+
+
+    def string(self, string_id):
+        """
+        Decodes one entry of the string table.
+        """
+        string_offset = self.columns["string_offset"]
+        start = self.data_offset + string_offset[string_id]
+        end = self.data_offset + string_offset[string_id + 1]
+        return str(self.buffer[start:end], "utf-8")
+
+
+    def question(self, row, question_class):
+        """
+        Materializes one row as a question object.
+        """
+        columns = self.columns
+        flags = columns["flags"][row]
+        question = question_class(bool(flags & FLAG_QUIZ))
+        question.question_id = columns["question_id"][row]
+        question.enabled = bool(flags & FLAG_ENABLED)
+        question.question_text = self.string(columns["text_ref"][row])
+        question.answer = self.string(columns["answer_ref"][row])
+        question.weight = columns["weight"][row]
+        question.shown_count = columns["shown_count"][row]
+        question.correct_count = columns["correct_count"][row]
+        question.last_seen = self.last_seen(row)
+        question.box = columns["box"][row]
+        if question.is_quiz:
+            question.answer_options = self.options(row)
+        tags = self.tags(row)
+        if tags:
+            question.tags = tags
+        return question
+
+
+    def lazy_question(self, row, question_class, source):
+        """
+        Creates a lazy question for a row that reads its text, answer and options through source on first use.
+        """
+        columns = self.columns
+        flags = columns["flags"][row]
+        question = question_class(bool(flags & FLAG_QUIZ), source, row, columns["question_id"][row],
+                                  bool(flags & FLAG_ENABLED), self.tags(row))
+        question.weight = columns["weight"][row]
+        question.shown_count = columns["shown_count"][row]
+        question.correct_count = columns["correct_count"][row]
+        question.last_seen = self.last_seen(row)
+        question.box = columns["box"][row]
+        return question
+
+
+    def options(self, row):
+        """
+        Decodes the answer options of a row.
+        """
+        option_ref = self.columns["option_ref"]
+        option_start = self.columns["option_start"]
+        return [self.string(option_ref[index]) for index in range(option_start[row], option_start[row + 1])]
+
+
+    def tags(self, row):
+        """
+        Decodes the tags of a row.
+        """
+        tag_ref = self.columns["tag_ref"]
+        tag_start = self.columns["tag_start"]
+        return [self.string(tag_ref[index]) for index in range(tag_start[row], tag_start[row + 1])]
+
+
+    def last_seen(self, row):
+        """
+        Returns the last seen time of a row, or None if it was never shown.
+        """
+        last_seen = self.columns["last_seen"][row]
+        return None if math.isnan(last_seen) else last_seen
+
+
+    def update_row(self, row, question):
+        """
+        Overwrites the fixed-width fields of a row in place.
+        """
+        columns = self.columns
+        columns["weight"][row] = question.weight
+        columns["shown_count"][row] = question.shown_count
+        columns["correct_count"][row] = question.correct_count
+        columns["last_seen"][row] = NEVER_SEEN if question.last_seen is None else question.last_seen
+        columns["box"][row] = question.box
+        flags = columns["flags"][row] & ~FLAG_ENABLED
+        columns["flags"][row] = flags | (FLAG_ENABLED if question.enabled else 0)
+
+
+    def flush(self):
+        """
+        Writes in-place changes back to the file.
+        """
+        self.map.flush()
+
+
+    def close(self):
+        """
+        Releases the column views and unmaps the file.
+        """
+        for column in getattr(self, "columns", {}).values():
+            column.release()
+        self.columns = {}
+        self.buffer.release()
+        self.map.close()
+
+
+class ColumnarSource:
+    """
+    Loads the text, answer and options of lazy questions from the rows of a mapped bank.
+
+    At most max_loaded questions keep their text in memory; loading another
+    one unloads the least recently loaded.
+    """
+
+    def __init__(self, bank, max_loaded=10000):
+        self.bank = bank
+        self.max_loaded = max_loaded
+        self.loaded = OrderedDict()
+
+
+    def load(self, question):
+        """
+        Decodes the row of a lazy question and fills in its text, answer and options.
+        """
+        bank = self.bank
+        row = question.offset
+        options = bank.options(row) if question.is_quiz else ()
+        question.materialize(bank.string(bank.columns["text_ref"][row]), bank.string(bank.columns["answer_ref"][row]), options)
+
+        self.loaded[id(question)] = question
+        if len(self.loaded) > self.max_loaded:
+            _, oldest = self.loaded.popitem(last=False)
+            oldest.unload()
+
+
+    def forget(self, question):
+        """
+        Stops tracking a question that was unloaded elsewhere.
+        """
+        self.loaded.pop(id(question), None)
+
+
+    def close(self):
+        """
+        Forgets the loaded questions; the bank itself is closed by its storage.
+        """
+        self.loaded.clear()
+
+
+class ColumnarStorage:
+    """
+    Storage backend that keeps questions and statistics in one columnar bank file.
+
+    Enabled flags and statistics are fixed-width columns, so toggling a
+    question or saving statistics writes those bytes in place. Adding a
+    question changes the string table and rewrites the file. With a lazy
+    question class only the fixed-width columns and tags are read when the
+    bank opens; text, answers and options are decoded from the mapped file
+    when first used.
+    """
+
+    extension = ".qbank"
+    assigns_ids = False
+
+    def __init__(self, file_path, read_only=False):
+        self.file_path = file_path
+        self.read_only = read_only  # Map the bank with ACCESS_READ; nothing can be written
+        self.bank = None
+        self.source = None  # ColumnarSource while lazily loaded questions point into the bank
+        self.rows = {}
+        self.pending_adds = 0
+
+
+    def open_bank(self):
+        """
+        Maps the bank file, if there is one.
+        """
+        self.close()
+        if os.path.isfile(self.file_path):
+            self.bank = ColumnarBank(self.file_path, writable=not self.read_only)
+            question_ids = self.bank.columns["question_id"]
+            self.rows = {question_ids[row]: row for row in range(len(self.bank))}
+
+
+    def load_questions(self, question_class):
+        """
+        Materializes every row of the bank, or creates lazy questions for a lazy question class.
+        """
+        self.open_bank()
+        self.pending_adds = 0
+        if self.bank is None:
+            return []
+        if getattr(question_class, "lazy", False):
+            self.source = ColumnarSource(self.bank)
+            return [self.bank.lazy_question(row, question_class, self.source) for row in range(len(self.bank))]
+        return [self.bank.question(row, question_class) for row in range(len(self.bank))]
+
+
+    def record_change(self, operation, question):
+        """
+        Writes an enabled flag in place; new questions wait for the next save.
+        """
+        self.record_changes(operation, [question])
+
+
+    def record_changes(self, operation, questions):
+        """
+        Writes the enabled flags of many questions in place and flushes once.
+        """
+        flush = False
+        for question in questions:
+            row = self.rows.get(question.question_id)
+            if operation == "enabled" and row is not None:
+                self.bank.update_row(row, question)
+                flush = True
+            else:
+                self.pending_adds += 1
+        if flush:
+            self.bank.flush()
+
+
+    def record_answer(self, question):
+        """
+        Writes the statistics of an answered question into the mapped file.
+        """
+        row = self.rows.get(question.question_id)
+        if row is not None:
+            self.bank.update_row(row, question)
+
+
+    def commit(self):
+        """
+        Flushes in-place changes to disk.
+        """
+        if self.bank is not None:
+            self.bank.flush()
+
+
+    def needs_compaction(self):
+        """
+        Checks if there are added questions that only a full save can store.
+        """
+        return self.pending_adds > 0
+
+
+    def save_questions(self, questions):
+        """
+        Rewrites the whole bank file and points lazy questions at their new rows.
+        """
+        lazy = self.source is not None
+        write_bank(self.file_path, questions, self.close)
+        self.open_bank()
+        self.pending_adds = 0
+        if lazy:
+            self.source = ColumnarSource(self.bank)
+            for row, question in enumerate(questions):
+                if getattr(question, "source", None) is not None:
+                    question.rebind(self.source, row)
+
+
+    def delete_all_questions(self):
+        """
+        Rewrites the bank without any questions.
+        """
+        self.save_questions([])
+
+
+    def load_statistics(self, question_manager):
+        """
+        Copies the statistics columns onto the corresponding questions.
+        """
+        if self.bank is None:
+            return
+        columns = self.bank.columns
+        for question_id, row in self.rows.items():
+            question = question_manager.get_question_by_id(question_id)
+            if question is not None:
+                question.weight = columns["weight"][row]
+                question.shown_count = columns["shown_count"][row]
+                question.correct_count = columns["correct_count"][row]
+                question.last_seen = self.bank.last_seen(row)
+                question.box = columns["box"][row]
+
+
+    def save_statistics(self, questions):
+        """
+        Updates the statistics columns in place, or rewrites the bank if its rows changed.
+        """
+        if self.bank is None or self.pending_adds or len(questions) != len(self.rows):
+            self.save_questions(questions)
+            return
+        for question in questions:
+            row = self.rows.get(question.question_id)
+            if row is None:
+                self.save_questions(questions)
+                return
+            self.bank.update_row(row, question)
+        self.bank.flush()
+
+
+    def clear_statistics(self):
+        """
+        Statistics are stored with the questions, so clearing the bank clears them too.
+        """
+
+
+    def close(self):
+        """
+        Unmaps the bank file.
+        """
+        if self.source is not None:
+            self.source.close()
+            self.source = None
+        if self.bank is not None:
+            self.bank.close()
+            self.bank = None
+        self.rows = {}
@@ -0,0 +1,167 @@
+import re
+import unicodedata
+from collections import OrderedDict
+
+
+WHITESPACE = re.compile(r"\s+")
+NUMBER = re.compile(r"[-+]?(\d+([.,]\d*)?|[.,]\d+)([eE][-+]?\d+)?")
+
+
+class ExactGrader:
+    """
+    The original grading: case-insensitive text, whole numbers for digit-only answers,
+    and option numbers for quiz questions.
+    """
+
+    def grade(self, question, user_answer):
+        """
+        Checks one answer.
+        """
+        return question.check_answer(user_answer)
+
+
+def normalize(text):
+    """
+    Folds an answer to a canonical form: Unicode-normalized, case-folded,
+    punctuation removed and runs of whitespace collapsed to one space.
+    """
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = "".join(" " if unicodedata.category(character).startswith("P") else character for character in text)
+    return WHITESPACE.sub(" ", text).strip()
+
+
+def parse_number(text):
+    """
+    Reads an answer that is a single number, accepting a decimal comma. Returns None otherwise.
+    """
+    text = text.strip()
+    if not NUMBER.fullmatch(text):
+        return None
+    return float(text.replace(",", "."))
+
+
+def edit_distance(first, second, limit):
+    """
+    Levenshtein distance between two strings, or limit + 1 as soon as it is known to exceed limit.
+    """
+    if abs(len(first) - len(second)) > limit:
+        return limit + 1
+    if len(first) < len(second):
+        first, second = second, first
+    previous = list(range(len(second) + 1))
+    for row, first_character in enumerate(first, 1):
+        current = [row]
+        for column, second_character in enumerate(second, 1):
+            current.append(min(previous[column] + 1, current[column - 1] + 1,
+                               previous[column - 1] + (first_character != second_character)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def token_set_similarity(first, second):
+    """
+    Jaccard similarity of the words of two normalized answers, ignoring order and repeats.
+    """
+    first_tokens = set(first.split())
+    second_tokens = set(second.split())
+    if not first_tokens and not second_tokens:
+        return 1.0
+    return len(first_tokens & second_tokens) / len(first_tokens | second_tokens)
+
+
+class FuzzyGrader:
+    """
+    Tolerant grading of free-form answers.
+
+    Numbers match within numeric_tolerance (absolute) or relative_tolerance
+    (of the expected value). Text is normalized and then accepted when its
+    edit-distance similarity or word-set similarity to the expected answer
+    reaches similarity_threshold. Results are kept in an LRU cache keyed
+    by question_id and the answer as it is compared (see cache_key), since
+    learners repeat the same wrong answers; an entry is reused only while
+    the expected answer is unchanged. Quiz questions are graded by option
+    number as before.
+    """
+
+    def __init__(self, similarity_threshold=0.85, numeric_tolerance=1e-9, relative_tolerance=0.0, cache_size=100000):
+        self.similarity_threshold = similarity_threshold
+        self.numeric_tolerance = numeric_tolerance
+        self.relative_tolerance = relative_tolerance
+        self.cache_size = cache_size
+        self.cache = OrderedDict()  # cache_key -> (expected answer, correct)
+        self.hits = 0
+        self.misses = 0
+
+
+    def grade(self, question, user_answer):
+        """
+        Checks one answer, using the cache when the same answer was graded before.
+        """
+        if question.is_quiz:
+            return question.check_answer(user_answer)
+        key, normalized = self.cache_key(question, str(user_answer))
+        entry = self.cache.get(key)
+        if entry is not None and entry[0] == question.answer:
+            self.cache.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        correct = self.similarity(question.answer, user_answer, normalized) >= self.similarity_threshold
+        self.cache[key] = (question.answer, correct)
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return correct
+
+
+    def cache_key(self, question, user_answer):
+        """
+        Returns the cache key of an answer and its normalized text, if text is what gets compared.
+
+        Normalizing drops signs and decimal points ("-3" and "3" both become
+        "3"), so answers to numeric questions are keyed by the number they
+        parse to, or by their stripped text when they are not a number.
+        """
+        if parse_number(question.answer) is not None:
+            user_number = parse_number(user_answer)
+            return (question.question_id, user_answer.strip() if user_number is None else user_number), None
+        normalized = normalize(user_answer)
+        return (question.question_id, normalized), normalized
+
+
+    def similarity(self, expected_answer, user_answer, normalized=None):
+        """
+        Scores an answer from 0 (unrelated) to 1 (a match).
+        """
+        expected_number = parse_number(expected_answer)
+        if expected_number is not None:
+            user_number = parse_number(str(user_answer))
+            if user_number is None:
+                return 0.0
+            allowed = max(self.numeric_tolerance, self.relative_tolerance * abs(expected_number))
+            return 1.0 if abs(user_number - expected_number) <= allowed else 0.0
+
+        expected = normalize(expected_answer)
+        normalized = normalize(str(user_answer)) if normalized is None else normalized
+        if normalized == expected:
+            return 1.0
+        longest = max(len(expected), len(normalized))
+        # Only distances that could still reach the threshold are worth computing exactly
+        limit = int(longest * (1 - self.similarity_threshold))
+        edit_similarity = 1 - edit_distance(expected, normalized, limit) / longest
+        return max(edit_similarity, token_set_similarity(expected, normalized))
+
+
+    def clear(self):
+        """
+        Forgets all cached results, e.g. after the threshold was changed.
+        """
+        self.cache.clear()
+
+
+GRADERS = {
+    "exact": ExactGrader,
+    "fuzzy": FuzzyGrader,
+}
@@ -0,0 +1,78 @@
+import os
+
+from persistence import append_durable
+
+
+class QuestionJournal:
+    """
+    Append-only log of question mutations kept next to the questions file.
+
+    Every entry records an absolute state change (a full question line or an
+    enabled flag), so replaying the log on top of a snapshot is idempotent and
+    a torn final line can simply be ignored.
+    """
+
+    def __init__(self, questions_file_path, compact_threshold=500):
+        self.file_path = questions_file_path + ".log"
+        self.compact_threshold = compact_threshold
+        self.entry_count = 0
+
+
+    def append(self, operation, *fields):
+        """
+        Appends one entry to the log and forces it to disk.
+        """
+        self.append_many([(operation,) + fields])
+
+
+    def append_many(self, entries):
+        """
+        Appends (operation, *fields) entries with a single write and fsync.
+        """
+        data = "".join("|".join(str(field) for field in entry) + '\n' for entry in entries)
+        if not data:
+            return
+        append_durable(self.file_path, data, 'utf-8')
+        self.entry_count += data.count('\n')
+
+
+    def needs_compaction(self):
+        """
+        Checks if the log has grown enough to be folded into the snapshot.
+        """
+        return self.entry_count >= self.compact_threshold
+
+
+    def read_entries(self, repair=True):
+        """
+        Yields (operation, payload) pairs for every complete entry in the log.
+
+        A torn last entry is cut off the file unless repair is False.
+        """
+        self.entry_count = 0
+        if not os.path.isfile(self.file_path):
+            return
+        valid_length = 0
+        torn = False
+        with open(self.file_path, 'r', encoding='utf-8', newline='') as file:
+            for line in file:
+                if not line.endswith('\n'):
+                    torn = True  # Partially written entry from an interrupted session
+                    break
+                valid_length += len(line.encode('utf-8'))
+                operation, _, payload = line.rstrip('\r\n').partition('|')
+                self.entry_count += 1
+                yield operation, payload
+        if torn and repair:
+            # Cut the torn entry off so the next append starts on a fresh line.
+            with open(self.file_path, 'r+b') as file:
+                file.truncate(valid_length)
+
+
+    def clear(self):
+        """
+        Empties the log once its entries are part of the snapshot.
+        """
+        if os.path.isfile(self.file_path):
+            os.remove(self.file_path)
+        self.entry_count = 0
@@ -0,0 +1,168 @@
+import os
+import random
+import hashlib
+from urllib.parse import quote
+
+from sampler import WeightedSampler
+from scheduler import WeightedScheduler
+from persistence import write_atomic
+
+
+class LearnerState:
+    """
+    One learner's weights and statistics over a shared question bank.
+
+    The bank's Question objects are only read; everything a learner changes
+    lives here, so many learners can practice on the same bank at once.
+    When a shard path is given the state is read from it on creation and
+    written back by save, so loading a learner touches only their own file.
+
+    Every question starts at weight 1, so only the questions this learner
+    has answered need a weight of their own. Those are kept in a small
+    sampler; the rest are drawn uniformly from the bank's shared list of
+    enabled questions. Memory and load time grow with the questions a
+    learner has answered, not with the size of the bank.
+    """
+
+    def __init__(self, user, question_manager, shard_path=None):
+        self.user = user
+        self.question_manager = question_manager
+        self.shard_path = shard_path
+        self.weights = {}         # question_id -> weight, only for questions answered by this learner
+        self.shown_counts = {}    # question_id -> times shown
+        self.correct_counts = {}  # question_id -> times answered correctly
+        self.slots = {}           # question_id -> slot in the sampler, for questions with a weight of their own
+        self.slot_questions = []  # questions in sampler slot order
+        self.weighted_enabled = 0  # how many of those are enabled
+        self.dirty = False
+        if shard_path is not None and os.path.isfile(shard_path):
+            self.load()
+        self.rebuild_sampler()
+
+
+    def rebuild_sampler(self):
+        """
+        Rebuilds the sampler over the questions this learner has weights for.
+
+        Enabled flags are read here, so call it again after questions are enabled or disabled.
+        """
+        self.slot_questions = [question for question in map(self.question_manager.get_question_by_id, self.weights) if question is not None]
+        self.slots = {question.question_id: slot for slot, question in enumerate(self.slot_questions)}
+        self.sampler = WeightedSampler(self.weights[question.question_id] if question.enabled else 0 for question in self.slot_questions)
+        self.weighted_enabled = sum(1 for question in self.slot_questions if question.enabled)
+
+
+    def get_weight(self, question_id):
+        """
+        Returns this learner's weight for a question (1 until it is answered).
+        """
+        return self.weights.get(question_id, 1)
+
+
+    def next_question(self, rng=random):
+        """
+        Draws an enabled question in proportion to this learner's weights.
+
+        The unanswered questions together weigh one per question; they are
+        drawn uniformly from the bank, skipping questions this learner has a
+        weight for.
+        """
+        base_total = self.question_manager.enabled_count - self.weighted_enabled
+        own_total = self.sampler.total()
+        if base_total + own_total <= 0:
+            return None
+        if rng.random() * (base_total + own_total) < own_total:
+            slot = self.sampler.sample(rng)
+            if slot is not None:
+                return self.slot_questions[slot]
+        while True:
+            question = self.question_manager.get_random_enabled_question(rng)
+            if question is None or question.question_id not in self.slots:
+                return question
+
+
+    def record_answer(self, question, correct):
+        """
+        Updates this learner's statistics and weight for an answered question.
+        """
+        question_id = question.question_id
+        self.shown_counts[question_id] = self.shown_counts.get(question_id, 0) + 1
+        if correct:
+            self.correct_counts[question_id] = self.correct_counts.get(question_id, 0) + 1
+        factor = WeightedScheduler.correct_factor if correct else WeightedScheduler.incorrect_factor
+        weight = self.get_weight(question_id) * factor
+        self.weights[question_id] = weight
+        self.dirty = True
+        slot = self.slots.get(question_id)
+        if slot is not None:
+            self.sampler.update(slot, weight if question.enabled else 0)
+        else:
+            self.slots[question_id] = self.sampler.append(weight if question.enabled else 0)
+            self.slot_questions.append(question)
+            if question.enabled:
+                self.weighted_enabled += 1
+
+
+    def totals(self):
+        """
+        Returns (questions shown, questions answered correctly) over all questions.
+        """
+        return sum(self.shown_counts.values()), sum(self.correct_counts.values())
+
+
+    def load(self):
+        """
+        Reads the shard. Each line is "question_id|weight|shown|correct"; ids no longer in the bank are dropped.
+        """
+        with open(self.shard_path, 'r') as file:
+            for line in file:
+                fields = line.strip().split('|')
+                if len(fields) != 4:
+                    continue
+                question_id = int(fields[0])
+                if question_id not in self.question_manager.question_positions:
+                    continue
+                self.weights[question_id] = float(fields[1])
+                self.shown_counts[question_id] = int(fields[2])
+                self.correct_counts[question_id] = int(fields[3])
+
+
+    def save(self):
+        """
+        Writes the shard if anything changed since it was last written.
+        """
+        if self.shard_path is None or not self.dirty:
+            return
+        os.makedirs(os.path.dirname(self.shard_path) or '.', exist_ok=True)
+        # The dirty flag already skips unchanged saves; a checksum record per learner would double the files
+        write_atomic(self.shard_path, "".join(
+            f"{question_id}|{weight}|{self.shown_counts.get(question_id, 0)}|{self.correct_counts.get(question_id, 0)}\n"
+            for question_id, weight in self.weights.items()), checksum=False)
+        self.dirty = False
+
+
+class LearnerStore:
+    """
+    Directory of per-learner shards.
+
+    Each learner's state is one small file, spread over 256 subdirectories
+    by a hash of the name so that no single directory grows too large.
+    """
+
+    def __init__(self, directory="learners"):
+        self.directory = directory
+
+
+    def shard_path(self, user):
+        """
+        Returns the path of a learner's shard; names are quoted so any name is a safe file name.
+        """
+        bucket = hashlib.sha1(user.encode('utf-8')).hexdigest()[:2]
+        return os.path.join(self.directory, bucket, quote(user, safe='') + ".txt")
+
+
+    def load(self, user, question_manager):
+        """
+        Returns the state of a learner, read from their shard if they have one.
+        """
+        return LearnerState(user, question_manager, self.shard_path(user))
@@ -0,0 +1,175 @@
+import os
+import io
+import time
+import bisect
+import pstats
+import cProfile
+import tracemalloc
+import contextlib
+
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.00001, 0.0001, 0.001, 0.01, 0.1, 1.0, 10.0)
+
+
+class Histogram:
+    """
+    Latency histogram with fixed buckets, a running sum and a count.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # The last bucket is +Inf
+        self.total = 0.0
+        self.count = 0
+
+
+    def observe(self, value):
+        """
+        Adds one observation.
+        """
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+class Metrics:
+    """
+    Counters and latency histograms for the hot paths of the program.
+
+    Everything is kept in memory and written out on request in the
+    Prometheus text exposition format, so the dump can be read by people
+    as well as by the usual metrics tooling.
+    """
+
+    def __init__(self, prefix="quiz"):
+        self.prefix = prefix
+        self.counters = {}
+        self.histograms = {}
+
+
+    def increment(self, name, amount=1):
+        """
+        Adds amount to a counter.
+        """
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+
+    def observe(self, name, seconds):
+        """
+        Records one latency observation.
+        """
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        histogram.observe(seconds)
+
+
+    @contextlib.contextmanager
+    def timer(self, name):
+        """
+        Records how long the block takes in the named histogram.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started)
+
+
+    def reset(self):
+        """
+        Forgets all counters and histograms.
+        """
+        self.counters = {}
+        self.histograms = {}
+
+
+    def format(self):
+        """
+        Renders all metrics in the Prometheus text format.
+        """
+        lines = []
+        for name in sorted(self.counters):
+            metric = f"{self.prefix}_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {self.counters[name]}")
+        for name in sorted(self.histograms):
+            histogram = self.histograms[name]
+            metric = f"{self.prefix}_{name}_seconds"
+            lines.append(f"# TYPE {metric} histogram")
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+                cumulative += count
+                lines.append(f'{metric}_bucket{{le="{bound}"}} {cumulative}')
+            lines.append(f"{metric}_sum {histogram.total:.9f}")
+            lines.append(f"{metric}_count {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+    def dump(self, file_path="metrics.txt"):
+        """
+        Writes all metrics to a file.
+        """
+        with open(file_path, 'w') as file:
+            file.write(self.format())
+
+
+class Profiler:
+    """
+    Opt-in cProfile and tracemalloc capture of an interactive session.
+
+    Started from the menu or by setting QUIZ_PROFILE=1; on stop the top
+    functions by cumulative time and the top allocation sites are written
+    to a report file.
+    """
+
+    def __init__(self, report_path="profile.txt"):
+        self.report_path = report_path
+        self.profile = None
+
+
+    def is_running(self):
+        return self.profile is not None
+
+
+    def start(self):
+        """
+        Starts profiling and tracing allocations.
+        """
+        if self.profile is None:
+            tracemalloc.start()
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+
+
+    def stop(self, limit=30):
+        """
+        Stops profiling and writes the report. Returns the report path.
+        """
+        if self.profile is None:
+            return None
+        self.profile.disable()
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+
+        report = io.StringIO()
+        report.write("--- CPU (cumulative time) ---\n")
+        pstats.Stats(self.profile, stream=report).sort_stats("cumulative").print_stats(limit)
+        report.write("--- Memory (allocation sites) ---\n")
+        for statistic in snapshot.statistics("lineno")[:limit]:
+            report.write(f"{statistic}\n")
+        with open(self.report_path, 'w') as file:
+            file.write(report.getvalue())
+        self.profile = None
+        return self.report_path
+
+
+def profiling_requested():
+    """
+    Checks the QUIZ_PROFILE environment variable.
+    """
+    return os.environ.get("QUIZ_PROFILE", "").lower() in ("1", "true", "yes", "on")
+
+
+METRICS = Metrics()  # Shared by all modes and storages
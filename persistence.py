@@ -0,0 +1,274 @@
+import os
+import atexit
+import signal
+import locale
+import hashlib
+import threading
+import contextlib
+
+from metrics import METRICS
+
+
+class BackgroundWriter:
+    """
+    Runs a flush function on a background thread once changes pile up.
+
+    Callers mark changes as dirty and carry on; the thread flushes when
+    max_pending changes are waiting or interval seconds after the first
+    one, so a burst of answers costs one write. Pending changes are also
+    flushed on close, at interpreter exit and on SIGTERM.
+    """
+
+    def __init__(self, flush_function, interval=2.0, max_pending=100):
+        self.flush_function = flush_function
+        self.interval = interval
+        self.max_pending = max_pending
+        self.pending = 0
+        self.closed = False
+        self.condition = threading.Condition()
+        self.flush_lock = threading.Lock()  # One flush at a time, from the thread or a caller
+        self.thread = None
+
+
+    def mark_dirty(self, count=1):
+        """
+        Records changes waiting to be flushed, starting the thread on first use.
+        """
+        with self.condition:
+            self.pending += count
+            if self.thread is None and not self.closed:
+                self.start()
+            if self.pending >= self.max_pending:
+                self.condition.notify()
+
+
+    def start(self):
+        """
+        Starts the writer thread and registers the exit and signal flushes.
+        """
+        self.thread = threading.Thread(target=self.run, name="background-writer", daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+        install_sigterm_handler()
+
+
+    def run(self):
+        """
+        Waits for enough changes or for the interval to pass, then flushes.
+        """
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.pending > 0 or self.closed)
+                if self.closed:
+                    return
+                self.condition.wait_for(lambda: self.pending >= self.max_pending or self.closed, self.interval)
+                if self.closed:
+                    return
+            self.flush()
+
+
+    def flush(self):
+        """
+        Flushes the pending changes now, on the calling thread.
+        """
+        with self.flush_lock:
+            with self.condition:
+                if self.pending == 0:
+                    return
+                self.pending = 0
+            self.flush_function()
+
+
+    def close(self):
+        """
+        Stops the thread and flushes whatever is still pending.
+        """
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+        self.flush()
+        atexit.unregister(self.close)
+        with self.condition:
+            # Later changes start a new thread
+            self.thread = None
+            self.closed = False
+
+
+def install_sigterm_handler():
+    """
+    Turns SIGTERM into a normal exit so the atexit flushes run.
+
+    Only done from the main thread and only when nothing else handles the signal.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        return
+    if signal.getsignal(signal.SIGTERM) is signal.SIG_DFL:
+        signal.signal(signal.SIGTERM, exit_on_signal)
+
+
+def exit_on_signal(signum, frame):
+    raise SystemExit(128 + signum)
+
+
+@contextlib.contextmanager
+def atomic_open(file_path, mode='w', **kwargs):
+    """
+    Opens a temporary file next to file_path that replaces it once the block completes.
+
+    The data is flushed and fsynced before the rename, and the directory
+    after it, so a crash leaves either the old file or the new one. If the
+    block raises, the temporary file is removed and the old file is kept.
+    """
+    temp_path = f"{file_path}.{os.getpid()}.tmp"  # Pool workers may write the same file at the same time
+    try:
+        with open(temp_path, mode, **kwargs) as file:
+            yield file
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, file_path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(temp_path)
+        raise
+    fsync_directory(file_path)
+
+
+def fsync_directory(file_path):
+    """
+    Makes a rename in the directory of file_path durable, where the platform allows it.
+    """
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    descriptor = os.open(os.path.dirname(os.path.abspath(file_path)), os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(descriptor)
+    except OSError:
+        pass  # Some file systems do not support syncing directories
+    finally:
+        os.close(descriptor)
+
+
+def encode_text(text, encoding=None):
+    """
+    Encodes text the way open() in text mode would write it.
+    """
+    if os.linesep != '\n':
+        text = text.replace('\n', os.linesep)
+    return text.encode(encoding or locale.getpreferredencoding(False))
+
+
+class FileChecksum:
+    """
+    Checksum record of a data file, kept next to it in "<file>.sum".
+
+    Holds the generation (how many times the file was saved), the SHA-256
+    of its contents and the size and modification time it had after the
+    last save, so a changed file is noticed without reading it.
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.record_path = file_path + ".sum"
+
+
+    def read(self):
+        """
+        Returns (generation, digest, size, mtime_ns), or None if there is no valid record.
+        """
+        try:
+            with open(self.record_path, 'r') as file:
+                generation, digest, size, mtime_ns = file.read().split()
+            return int(generation), digest, int(size), int(mtime_ns)
+        except (OSError, ValueError):
+            return None
+
+
+    def generation(self):
+        """
+        Returns how many times the file has been saved, 0 if never.
+        """
+        record = self.read()
+        return 0 if record is None else record[0]
+
+
+    def is_current(self, digest):
+        """
+        Checks that the file on disk is still the one last saved with this digest.
+        """
+        record = self.read()
+        if record is None or record[1] != digest:
+            return False
+        try:
+            stat = os.stat(self.file_path)
+        except OSError:
+            return False
+        return (stat.st_size, stat.st_mtime_ns) == (record[2], record[3])
+
+
+    def write(self, digest):
+        """
+        Records a new save of the file, bumping the generation.
+
+        The record is not fsynced: losing it only means the next save
+        cannot be skipped.
+        """
+        stat = os.stat(self.file_path)
+        temp_path = f"{self.record_path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w') as file:
+            file.write(f"{self.generation() + 1} {digest} {stat.st_size} {stat.st_mtime_ns}\n")
+        os.replace(temp_path, self.record_path)
+
+
+    def verify(self):
+        """
+        Checks the file contents against the recorded digest. Returns None if there is no record.
+        """
+        record = self.read()
+        if record is None:
+            return None
+        digest = hashlib.sha256()
+        with open(self.file_path, 'rb') as file:
+            for block in iter(lambda: file.read(1 << 20), b''):
+                digest.update(block)
+        return digest.hexdigest() == record[1]
+
+
+def write_atomic(file_path, data, checksum=True, encoding=None):
+    """
+    Replaces a file with data (text or bytes) through a temporary file.
+
+    With checksum the file's checksum record is updated, and a save whose
+    contents hash the same as the file already on disk is skipped. Returns
+    True if the file was written, False if it was skipped.
+    """
+    if isinstance(data, str):
+        data = encode_text(data, encoding)
+    if checksum:
+        digest = hashlib.sha256(data).hexdigest()
+        record = FileChecksum(file_path)
+        if record.is_current(digest):
+            METRICS.increment("saves_skipped")
+            return False
+    with atomic_open(file_path, 'wb') as file:
+        file.write(data)
+    METRICS.increment("bytes_written", len(data))
+    if checksum:
+        record.write(digest)
+    return True
+
+
+def append_durable(file_path, data, encoding=None):
+    """
+    Appends data (text or bytes) to a file and forces it to disk. Returns the offset it was written at.
+    """
+    if isinstance(data, str):
+        data = encode_text(data, encoding)
+    with open(file_path, 'ab') as file:
+        offset = file.tell()
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+    METRICS.increment("bytes_written", len(data))
+    return offset
@@ -1,30 +1,72 @@
+import time
 import random
 import datetime
 
+from results_log import ResultsLog
+from metrics import METRICS
+from persistence import append_durable
+
+
+def parse_topics(text):
+    """
+    Reads a topic choice such as "math" or "math:2, history:1".
+
+    Returns None for all questions, otherwise a dict of tag -> share.
+    """
+    topics = {}
+    for part in text.split(","):
+        tag, _, share = part.partition(":")
+        if tag.strip():
+            topics[tag.strip()] = float(share) if share.strip() else 1.0
+    return topics or None
+
+
+def ask_topics(question_manager):
+    """
+    Asks which topics to draw from, if the bank has any tags. Returns None for all questions.
+    """
+    tags = question_manager.get_tags()
+    if not tags:
+        return None
+    print(f"Topics: {', '.join(tags)}")
+    while True:
+        try:
+            return parse_topics(input("Enter topics, optionally weighted like 'math:2, history:1' (Enter for all): "))
+        except ValueError:
+            print("Invalid topic weight. Please enter a number after ':'.")
+
+
+def allocate(total, weights):
+    """
+    Splits total into whole counts in proportion to the weights, by largest remainder.
+    """
+    weight_sum = sum(weights)
+    shares = [total * weight / weight_sum for weight in weights]
+    counts = [int(share) for share in shares]
+    by_remainder = sorted(range(len(weights)), key=lambda index: shares[index] - counts[index], reverse=True)
+    for index in by_remainder[:total - sum(counts)]:
+        counts[index] += 1
+    return counts
+
+
 class PracticeMode:
 
-    def __init__(self, question_manager):
+    def __init__(self, question_manager, tags=None):
         self.question_manager = question_manager
+        self.tags = tags  # None, a tag, a list of tags or a dict of tag -> share
 
 
     def get_random_question(self):
         """
-        Retrieves a random enabled question for practice mode.
+        Retrieves the next enabled question for practice mode from the scheduler,
+        limited to the chosen topics if any.
         """
-        if len(self.question_manager.get_enabled_questions()) < 5:
+        if self.question_manager.count_enabled(self.tags) < 5:
             print("At least 5 active questions are required for practice mode.")
             return None
 
-        # Calculate total weight
-        total_weight = sum(question.weight for question in self.question_manager.get_enabled_questions())
-
-        # Calculate weights for random.choices
-        weights = [question.weight / total_weight for question in self.question_manager.get_enabled_questions()]
-
-        # Select a random question based on weights
-        selected_question = random.choices(self.question_manager.get_enabled_questions(), weights=weights)[0]
-
-        return selected_question
+        with METRICS.timer("question_selection"):
+            return self.question_manager.scheduler.next_question(self.tags)
     
 
     def practice_mode(self):
@@ -33,6 +75,8 @@ class PracticeMode:
         """
         score = 0
         print("\n--- Practice Mode ---")
+        if self.tags is None:
+            self.tags = ask_topics(self.question_manager)
 
         while True:
             question = self.get_random_question()
@@ -41,6 +85,7 @@ class PracticeMode:
 
             print(f"\nQuestion {question.question_id}: {question.question_text}")
             question.shown_count += 1
+            question.last_seen = time.time()
 
             if question.is_free_form():
                 while True:
@@ -50,15 +95,17 @@ class PracticeMode:
                     if user_answer.strip() == "":
                         print("Please enter a valid answer.")
                         continue
-                    if question.compare_answers(user_answer):
+                    with METRICS.timer("answer_evaluation"):
+                        correct = self.question_manager.grader.grade(question, user_answer)
+                    if correct:
                         print("Correct answer!")
                         question.increment_shown_count()
                         question.increment_correct_count()
                         question.correct_count += 1
-                        question.weight *= 0.8  # decrease weight
+                        self.question_manager.scheduler.record_answer(question, True)
                     else:
                         print(f"Incorrect answer! The correct answer is {question.answer}.")
-                        question.weight *= 1.2  # increase weight
+                        self.question_manager.scheduler.record_answer(question, False)
                     break
             else:
                 while True:
@@ -75,38 +122,41 @@ class PracticeMode:
                         if user_option < 0 or user_option >= len(question.answer_options):
                             print("Please enter a valid option.")
                             continue
-                        correct_option_index = question.get_correct_option_index()
-                        if correct_option_index is not None and user_option == correct_option_index:
+                        with METRICS.timer("answer_evaluation"):
+                            correct_option_index = question.get_correct_option_index()
+                            correct = correct_option_index is not None and user_option == correct_option_index
+                        if correct:
                             print("Correct answer!")
                             question.increment_shown_count()
                             question.increment_correct_count()
                             score += 1
                             question.correct_count += 1
-                            question.weight *= 0.8  # decrease weight
+                            self.question_manager.scheduler.record_answer(question, True)
                         else:
                             if correct_option_index is not None:  
                                 print(f"Incorrect answer! The correct option is {correct_option_index + 1}.")
                             else:
                                 print("Incorrect answer!")
                             question.increment_shown_count()
-                            question.weight *= 1.2  # increase weight
+                            self.question_manager.scheduler.record_answer(question, False)
                         break
                     except ValueError:
                         print("Please enter a valid option.")
                         continue
 
-
-            self.question_manager.update_probabilities()
-            self.question_manager.save_questions()
+            self.question_manager.record_answer(question)
 
             if user_answer.lower() == 'q':
                 break
 
+        self.question_manager.commit_changes()
 
 
 class TestMode:
-    def __init__(self, question_manager):
+    def __init__(self, question_manager, results_log=None, tags=None):
         self.question_manager = question_manager
+        self.results_log = results_log if results_log is not None else ResultsLog()
+        self.tags = tags  # None, a tag, a list of tags or a dict of tag -> share
 
 
     def test_mode(self):
@@ -120,13 +170,21 @@ class TestMode:
             print("Minimum 5 questions are required to enter the test mode.")
             return
 
-        questions = self.question_manager.get_enabled_questions()
+        if self.tags is None:
+            self.tags = ask_topics(self.question_manager)
+        questions = self.question_manager.get_enabled_questions(self.tags)
         if len(questions) < num_questions:
             print(f"Insufficient number of questions available. Total questions: {len(questions)}")
             return
 
-        selected_questions = random.sample(questions, num_questions)
+        with METRICS.timer("question_selection"):
+            if isinstance(self.tags, dict):
+                selected_questions = [self.question_manager.get_question_by_id(question_id)
+                                      for question_id in self.draw_topic_form(self.tags, num_questions, random)]
+            else:
+                selected_questions = random.sample(questions, num_questions)
         score = 0
+        outcomes = []
 
         print("--- Test Started ---")
         question_number = 1
@@ -134,6 +192,8 @@ class TestMode:
             print(f"\nQuestion {question_number}: {question.question_text}")
             question_number += 1
             question.shown_count += 1
+            question.last_seen = time.time()
+            started = time.perf_counter()
 
             if question.is_free_form():
                 while True:
@@ -141,7 +201,9 @@ class TestMode:
                     if user_answer.strip() != "":
                         break
                     print("Please enter a valid answer.")
-                if question.compare_answers(user_answer):
+                with METRICS.timer("answer_evaluation"):
+                    correct = self.question_manager.grader.grade(question, user_answer)
+                if correct:
                     print("Correct answer!")
                     score += 1
                     question.correct_count += 1
@@ -155,8 +217,10 @@ class TestMode:
                     try:
                         user_option = int(user_answer)
                         if user_option >= 1 and user_option <= len(question.answer_options):
-                            correct_option_index = question.get_correct_option_index()
-                            if correct_option_index is not None and user_option - 1 == correct_option_index:
+                            with METRICS.timer("answer_evaluation"):
+                                correct_option_index = question.get_correct_option_index()
+                                correct = correct_option_index is not None and user_option - 1 == correct_option_index
+                            if correct:
                                 print("Correct answer!")
                                 score += 1
                                 question.correct_count += 1
@@ -171,24 +235,137 @@ class TestMode:
                     except ValueError:
                         print("Please enter a valid option.")
 
+            outcomes.append((question.question_id, correct, time.perf_counter() - started))
+            self.question_manager.record_answer(question)
+
+        self.question_manager.commit_changes()
+
         print("\n--- Test Finished ---")
         percentage = (score / num_questions) * 100
         print(f"Score: {percentage:.2f}% | Questions: {score}/{num_questions}")
 
-        self.record_result(percentage, score, num_questions)
+        self.record_result(percentage, score, num_questions, outcomes)
+
+
+
+    def generate_tests(self, num_tests, num_questions, seed=None, stratify=False, tags=None):
+        """
+        Generates test forms without any console interaction.
+
+        Each form is a list of distinct enabled question IDs, from the given
+        tags only if there are any. With a dict of tag -> share, each form
+        is split across the topics by share. With a seed the forms are
+        reproducible. With stratify, every form keeps the bank's share of
+        quiz and free-form questions; it cannot be combined with shares.
+        """
+        rng = random.Random(seed)
+        questions = self.question_manager.get_enabled_questions(tags)
+        if len(questions) < num_questions:
+            raise ValueError(f"Insufficient number of questions available. Total questions: {len(questions)}")
+
+        if isinstance(tags, dict):
+            if stratify:
+                raise ValueError("Stratified forms cannot be split by topic shares.")
+            return [self.draw_topic_form(tags, num_questions, rng) for _ in range(num_tests)]
+
+        if not stratify:
+            question_ids = [question.question_id for question in questions]
+            return [rng.sample(question_ids, num_questions) for _ in range(num_tests)]
+
+        groups = [
+            [question.question_id for question in questions if question.is_quiz],
+            [question.question_id for question in questions if not question.is_quiz],
+        ]
+        counts = allocate(num_questions, [len(group) for group in groups])
+
+        forms = []
+        for _ in range(num_tests):
+            form = []
+            for group, count in zip(groups, counts):
+                form.extend(rng.sample(group, count))
+            rng.shuffle(form)
+            forms.append(form)
+        return forms
+
+
+    def draw_topic_form(self, shares, num_questions, rng):
+        """
+        Draws one form of distinct enabled question IDs, split across the topics by share.
+
+        Each topic's count is sampled from its enabled questions without
+        replacement, skipping questions already drawn for another topic.
+        When a topic runs short, the rest comes from any of the topics.
+        """
+        shares = self.question_manager.topic_shares(shares)
+        counts = allocate(num_questions, list(shares.values()))
+        form = []
+        drawn = set()
+        for tag, count in zip(shares, counts):
+            candidates = sorted(self.question_manager.tag_enabled[tag] - drawn)
+            picked = rng.sample(candidates, min(count, len(candidates)))
+            form.extend(picked)
+            drawn.update(picked)
+        if len(form) < num_questions:
+            rest = sorted(set().union(*(self.question_manager.tag_enabled[tag] for tag in shares)) - drawn)
+            form.extend(rng.sample(rest, num_questions - len(form)))
+        rng.shuffle(form)
+        return form
+
+
+    def grade_answer(self, question, user_answer):
+        """
+        Checks one answer with the manager's grader, the same way test mode does.
+        """
+        with METRICS.timer("answer_evaluation"):
+            return self.question_manager.grader.grade(question, user_answer)
 
 
+    def grade_tests(self, submissions, update_statistics=False):
+        """
+        Grades answer sheets in bulk.
 
-    def record_result(self, score_percentage, num_correct, num_questions):
+        Each submission is a (user, question_ids, answers) tuple with one answer
+        per question ID. Returns one record per submission with the user, the
+        score, the percentage and a list of (question_id, correct) outcomes.
         """
-        Records the test result to a file.
+        results = []
+        for user, question_ids, answers in submissions:
+            outcomes = []
+            score = 0
+            for question_id, user_answer in zip(question_ids, answers):
+                question = self.question_manager.get_question_by_id(question_id)
+                correct = question is not None and self.grade_answer(question, user_answer)
+                if correct:
+                    score += 1
+                if update_statistics and question is not None:
+                    question.shown_count += 1
+                    if correct:
+                        question.correct_count += 1
+                    self.question_manager.record_answer(question)
+                outcomes.append((question_id, correct))
+            results.append({
+                "user": user,
+                "score": score,
+                "num_questions": len(outcomes),
+                "percentage": (score / len(outcomes)) * 100 if outcomes else 0.0,
+                "outcomes": outcomes,
+            })
+        if update_statistics:
+            self.question_manager.commit_changes()
+        return results
+
+
+    def record_result(self, score_percentage, num_correct, num_questions, outcomes=()):
+        """
+        Records the test result to a file and, with per-question outcomes, to the structured results log.
         """
         now = datetime.datetime.now()
         timestamp = now.strftime("%Y-%m-%d %H:%M:%S")
         result = f"{timestamp} | Score: {score_percentage:.2f}% | Questions: {num_correct}/{num_questions}\n"
 
-        with open("results.txt", "a") as file:
-            file.write(result)
+        append_durable("results.txt", result)
+
+        self.results_log.append(score_percentage, num_correct, num_questions, outcomes, now.timestamp())
 
    
 
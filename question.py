@@ -1,24 +1,136 @@
 import re
 import os
+import sys
 import random
 
+from sampler import WeightedSampler
+from storage import QUESTION_TYPES, open_storage
+from scheduler import SCHEDULERS
+from grading import GRADERS
+from search import SearchIndex
+from metrics import METRICS, Profiler, profiling_requested
+
+
+NO_OPTIONS = ()  # Shared by every question without options
+NO_TAGS = ()     # Shared by every question without tags
+SHARED_TUPLES = {}  # Option and tag tuples already in use, so equal ones are stored once
+
+
+def intern_tuple(values):
+    """
+    Returns a tuple of the interned values, reusing an equal tuple when one is already in use.
+
+    Banks repeat the same options ("True", "False") and tags across many
+    questions, so sharing the tuples saves one tuple per question.
+    """
+    values = tuple(map(sys.intern, values))
+    if not values:
+        return NO_OPTIONS
+    return SHARED_TUPLES.setdefault(values, values)
+
 
 class Question:
     next_id = 1
+
+    # Fixed attribute slots instead of a per-instance __dict__ keep large banks small.
+    __slots__ = (
+        "question_id", "is_quiz", "question_text", "_answer", "_answer_options", "enabled", "weight",
+        "shown_count", "correct_count", "last_seen", "box",
+        "numeric_answer", "folded_answer", "correct_option_index", "_tags",
+    )
     
     def __init__(self, is_quiz=False):
         self.question_id = Question.next_id
         Question.next_id += 1
         self.is_quiz = is_quiz
         self.question_text = ""
-        self.answer = ""
-        self.answer_options = []
+        self._answer_options = NO_OPTIONS
+        # What the answer setter stores for an empty answer, without running it
+        self._answer = ""
+        self.numeric_answer = None
+        self.folded_answer = ""
+        self.correct_option_index = None
+        self._tags = NO_TAGS
         self.enabled = True
         self.weight = 1
-        self.expected_answer = ""
         self.shown_count = 0
         self.correct_count = 0
-        self.correct_option_index = None
+        self.last_seen = None  # Unix time of the last time the question was shown
+        self.box = 0  # Leitner box, see scheduler.LeitnerScheduler
+
+
+    @property
+    def answer(self):
+        return self._answer
+
+
+    @answer.setter
+    def answer(self, answer):
+        """
+        Stores the answer together with its precompiled matcher: the integer
+        value for digit-only answers and the case-folded text otherwise.
+        """
+        self._answer = sys.intern(answer)
+        expected_answer = answer.strip()
+        self.numeric_answer = int(expected_answer) if expected_answer.isdecimal() else None
+        folded_answer = expected_answer.casefold()
+        self.folded_answer = self._answer if folded_answer == self._answer else sys.intern(folded_answer)
+        self.correct_option_index = self.find_correct_option_index()
+
+
+    @property
+    def answer_options(self):
+        return self._answer_options
+
+
+    @answer_options.setter
+    def answer_options(self, answer_options):
+        """
+        Stores the options as a shared tuple of interned strings and caches the index of the correct one.
+        """
+        self._answer_options = intern_tuple(answer_options)
+        self.correct_option_index = self.find_correct_option_index()
+
+
+    @property
+    def tags(self):
+        return self._tags
+
+
+    @tags.setter
+    def tags(self, tags):
+        """
+        Stores the tags as a shared tuple of interned strings, without surrounding whitespace, blanks or repeats.
+        """
+        self._tags = intern_tuple(dict.fromkeys(tag.strip() for tag in tags if tag.strip()))
+
+
+    def set_tags(self, tags):
+        """
+        Set the tags (topics) of the question from a list or a comma-separated string.
+
+        Question type names are refused: the questions file tells a tag field
+        from the type field by them.
+        """
+        if isinstance(tags, str):
+            tags = tags.split(",")
+        for tag in tags:
+            if "|" in tag or "," in tag:
+                raise ValueError("Tags cannot contain '|' or ','.")
+            if tag.strip() in QUESTION_TYPES:
+                raise ValueError(f"'{tag.strip()}' is a question type and cannot be used as a tag.")
+        self.tags = tags
+
+
+    def find_correct_option_index(self):
+        """
+        Finds the first option that matches the answer, ignoring case and surrounding whitespace.
+        """
+        if self.is_quiz:
+            for index, option in enumerate(self._answer_options):
+                if option.strip().casefold() == self.folded_answer:
+                    return index
+        return None
 
 
     def is_free_form(self):
@@ -51,10 +163,19 @@ class Question:
         Add an option to a quiz question.
         """
         if self.is_quiz:
-            self.answer_options.append(option)
+            self._answer_options = intern_tuple(self._answer_options + (option,))
             if is_correct:
-                self.correct_option_index = len(self.answer_options) - 1
                 self.answer = option
+            elif self.correct_option_index is None:
+                self.correct_option_index = self.find_correct_option_index()
+
+
+    @property
+    def correct_percentage(self):
+        """
+        The percentage of correct answers, kept for code that read the value load_statistics used to store.
+        """
+        return self.get_correct_percentage()
 
 
     def get_correct_percentage(self):
@@ -87,11 +208,7 @@ class Question:
         """
         Get the index of the correct option for a quiz question.
         """
-        if self.is_quiz:
-            for index, option in enumerate(self.answer_options):
-                if option.strip().lower() == self.answer.strip().lower():
-                    return index
-        return None
+        return self.correct_option_index
 
 
     def compare_answers(self, user_answer):
@@ -99,49 +216,200 @@ class Question:
         Compare the user's answer to the expected answer.
         """
         user_answer = user_answer.strip()
-        expected_answer = self.answer.strip()
 
-        if re.match(r'^\d+$', expected_answer):
+        if self.numeric_answer is not None:
             try:
-                return int(user_answer) == int(expected_answer)
+                return int(user_answer) == self.numeric_answer
             except ValueError:
                 return False
         else:
-            return user_answer.lower() == expected_answer.lower()
+            return user_answer.casefold() == self.folded_answer
         
 
+    def check_answer(self, user_answer):
+        """
+        Check an answer as a learner types it: free-form text, or the 1-based option number for quiz questions.
+        """
+        if self.is_free_form():
+            return self.compare_answers(str(user_answer))
+        try:
+            user_option = int(user_answer)
+        except (TypeError, ValueError):
+            return False
+        correct_option_index = self.get_correct_option_index()
+        return correct_option_index is not None and user_option - 1 == correct_option_index
+
+
+    def cache_state(self):
+        """
+        Returns the parsed fields and precomputed matchers kept in the snapshot cache.
+        """
+        return (self.question_id, self.is_quiz, self.enabled, self.question_text, self._answer, self._answer_options,
+                self.numeric_answer, self.folded_answer, self.correct_option_index, self._tags)
+
+
+    @classmethod
+    def from_cache_state(cls, state):
+        """
+        Recreates a question from cache_state without re-parsing or re-running the answer setters.
+        """
+        question = cls.__new__(cls)
+        (question.question_id, question.is_quiz, question.enabled, question.question_text, question._answer,
+         question._answer_options, question.numeric_answer, question.folded_answer, question.correct_option_index,
+         question._tags) = state
+        question._answer_options = intern_tuple(question._answer_options)
+        question._tags = intern_tuple(question._tags)
+        # Statistics start out as in __init__; load_statistics fills them in
+        question.weight = 1
+        question.shown_count = 0
+        question.correct_count = 0
+        question.last_seen = None
+        question.box = 0
+        return question
+
+
     def __str__(self):
         """
         Convert the Question object to a string representation.
         """
         question_type = "QuizQuestion" if self.is_quiz else "FreeformQuestion"
+        # Tags were added later, as an optional field after the type, so untagged lines keep the old format
+        tags = "|" + ",".join(self.tags) if self.tags else ""
         if self.is_quiz:
             options = ",".join(str(option) for option in self.answer_options)
-            return f"{self.question_id}|{str(self.enabled)}|{self.question_text}|{options}|{self.answer}|{question_type}"
+            return f"{self.question_id}|{str(self.enabled)}|{self.question_text}|{options}|{self.answer}|{question_type}{tags}"
         else:
-            return f"{self.question_id}|{str(self.enabled)}|{self.question_text}|{self.answer}|{question_type}"
+            return f"{self.question_id}|{str(self.enabled)}|{self.question_text}|{self.answer}|{question_type}{tags}"
 
-########################################################################################################################
 
-from practice_test import PracticeMode, TestMode
-from stats import StatisticsMode
+class LazyQuestion(Question):
+    """
+    A question whose text, answer and options stay in the questions file until first used.
+
+    Only the ID, status, type, tags, statistics and the offset of its line
+    are kept in memory. Reading any text attribute loads the line through its source.
+    Created without a source it behaves like a normal Question.
+    """
+
+    __slots__ = ("source", "offset")
+    lazy = True
+    lazy_fields = frozenset(("question_text", "_answer", "_answer_options", "numeric_answer", "folded_answer", "correct_option_index"))
+
+    def __init__(self, is_quiz=False, source=None, offset=0, question_id=None, enabled=True, tags=NO_TAGS):
+        self.source = source
+        self.offset = offset
+        if source is None:
+            Question.__init__(self, is_quiz)
+            return
+        self.question_id = question_id
+        self.is_quiz = is_quiz
+        self.enabled = enabled
+        self.tags = tags
+        self.weight = 1
+        self.shown_count = 0
+        self.correct_count = 0
+        self.last_seen = None
+        self.box = 0
+
+
+    def __getattr__(self, name):
+        """
+        Called only for empty slots: loads the text fields on first use.
+        """
+        if name not in self.lazy_fields or self.source is None:
+            raise AttributeError(name)
+        self.source.load(self)
+        return object.__getattribute__(self, name)
+
+
+    def is_slot_set(self, name):
+        """
+        Checks if a slot holds a value without triggering a load.
+        """
+        try:
+            Question.__dict__[name].__get__(self, Question)
+            return True
+        except AttributeError:
+            return False
+
+
+    def materialize(self, question_text, answer, answer_options):
+        """
+        Fills in the text fields read from the questions file, keeping any answer set in memory meanwhile.
+        """
+        self.question_text = question_text
+        self._answer_options = NO_OPTIONS
+        if not self.is_slot_set("_answer"):
+            self.answer = answer
+        self.answer_options = answer_options
+
+
+    def unload(self):
+        """
+        Drops the text fields again; they are reloaded from the file on next use.
+        """
+        if self.source is None:
+            return
+        for name in self.lazy_fields:
+            if self.is_slot_set(name):
+                delattr(self, name)
+        self.source.forget(self)
+
+
+    def rebind(self, source, offset):
+        """
+        Points the question at its line in a newly written questions file.
+        """
+        self.unload()
+        self.source = source
+        self.offset = offset
 
 
 class QuestionManager:
 
-    def __init__(self, file_path="questions.txt"):
+    def __init__(self, file_path="questions.txt", statistics_path="statistics.txt", storage=None, scheduler="weighted", lazy=False, grading="exact"):
         """
         Manages the questions in the system.
+
+        Questions are stored in the backend picked by open_storage unless a storage object is given.
+        Practice questions are picked by the named scheduler from scheduler.SCHEDULERS.
+        With lazy, the text and columnar storages only index the bank and read question text on demand.
+        Free-form answers are checked by the named grader from grading.GRADERS.
         """
+        self.question_class = LazyQuestion if lazy else Question
         self.questions = []
         self.file_path = file_path
+        self.storage = storage if storage is not None else open_storage(file_path, statistics_path)
         #self.load_questions()
         self.assign_question_ids()
         self.weights = []
+        self.sampler = WeightedSampler()
+        self.question_positions = {}  # question_id -> index in self.questions and sampler slot
+        self.enabled_count = 0
+        self.enabled_questions = None  # Cached list for get_enabled_questions; None when out of date
+        self.tag_samplers = {}   # tag -> WeightedSampler over the questions with that tag
+        self.tag_questions = {}  # tag -> questions with that tag, in sampler slot order
+        self.tag_slots = {}      # tag -> {question_id: slot in the tag's sampler}
+        self.tag_enabled = {}    # tag -> set of IDs of the enabled questions with that tag
+        self.scheduler = SCHEDULERS[scheduler](self)
+        self.grader = GRADERS[grading]()
+        self.search_index = SearchIndex(self)
         self.update_probabilities()
-        self.statistics_view = StatisticsMode(self)
-        self.load_questions()
-        self.statistics_view.load_statistics()
+        self._statistics_view = None
+        # One pass over the storage; the sampler is built once, after the statistics are in
+        self.load_questions(rebuild_sampler=False)
+        self.load_statistics()
+
+
+    @property
+    def statistics_view(self):
+        """
+        The statistics mode, created (and its module imported) on first use.
+        """
+        if self._statistics_view is None:
+            from stats import StatisticsMode
+            self._statistics_view = StatisticsMode(self)
+        return self._statistics_view
 
 
     def assign_question_ids(self):
@@ -160,6 +428,170 @@ class QuestionManager:
         self.probabilities = [question.weight for question in self.questions]
 
 
+    def rebuild_index(self):
+        """
+        Rebuilds the question ID index from the question list; the search index is rebuilt on its next use.
+        """
+        self.question_positions = {question.question_id: index for index, question in enumerate(self.questions)}
+        self.search_index.clear()
+
+
+    def rebuild_sampler(self):
+        """
+        Rebuilds the weighted samplers, overall and per tag, and the scheduler over the enabled questions.
+        """
+        self.sampler.rebuild(question.weight if question.enabled else 0 for question in self.questions)
+        self.enabled_count = sum(1 for question in self.questions if question.enabled)
+        self.enabled_questions = None
+        self.rebuild_tag_samplers()
+        self.scheduler.rebuild()
+
+
+    def rebuild_tag_samplers(self):
+        """
+        Rebuilds the sampler and the enabled-question set of every tag.
+        """
+        self.tag_samplers = {}
+        self.tag_questions = {}
+        self.tag_slots = {}
+        self.tag_enabled = {}
+        for question in self.questions:
+            for tag in question.tags:
+                tag_questions = self.tag_questions.get(tag)
+                if tag_questions is None:
+                    tag_questions = self.tag_questions[tag] = []
+                    self.tag_slots[tag] = {}
+                    self.tag_enabled[tag] = set()
+                self.tag_slots[tag][question.question_id] = len(tag_questions)
+                tag_questions.append(question)
+                if question.enabled:
+                    self.tag_enabled[tag].add(question.question_id)
+        for tag, tag_questions in self.tag_questions.items():
+            self.tag_samplers[tag] = WeightedSampler(question.weight if question.enabled else 0 for question in tag_questions)
+
+
+    def add_to_tag_samplers(self, question):
+        """
+        Appends a new question to the samplers of its tags.
+        """
+        for tag in question.tags:
+            if tag not in self.tag_samplers:
+                self.tag_samplers[tag] = WeightedSampler()
+                self.tag_questions[tag] = []
+                self.tag_slots[tag] = {}
+                self.tag_enabled[tag] = set()
+            self.tag_slots[tag][question.question_id] = self.tag_samplers[tag].append(question.weight if question.enabled else 0)
+            self.tag_questions[tag].append(question)
+            if question.enabled:
+                self.tag_enabled[tag].add(question.question_id)
+
+
+    def update_tag_samplers(self, question):
+        """
+        Updates the weight and enabled status of a question in the samplers of its tags.
+        """
+        weight = question.weight if question.enabled else 0
+        for tag in question.tags:
+            self.tag_samplers[tag].update(self.tag_slots[tag][question.question_id], weight)
+            if question.enabled:
+                self.tag_enabled[tag].add(question.question_id)
+            else:
+                self.tag_enabled[tag].discard(question.question_id)
+
+
+    def get_tags(self):
+        """
+        Returns every tag in the bank, sorted.
+        """
+        return sorted(self.tag_samplers)
+
+
+    def set_question_weight(self, question, weight):
+        """
+        Sets the weight of a question and updates the samplers in place.
+        """
+        question.weight = weight
+        if question.enabled:
+            self.sampler.update(self.question_positions[question.question_id], weight)
+            self.update_tag_samplers(question)
+
+
+    def set_question_enabled(self, question, enabled):
+        """
+        Enables or disables a question and updates the samplers in place.
+        """
+        if question.enabled != enabled:
+            self.enabled_count += 1 if enabled else -1
+            self.enabled_questions = None
+        question.enabled = enabled
+        self.sampler.update(self.question_positions[question.question_id], question.weight if enabled else 0)
+        self.update_tag_samplers(question)
+        self.scheduler.reschedule(question)
+
+
+    def get_weighted_enabled_question(self, tags=None):
+        """
+        Draws an enabled question with probability proportional to its weight.
+
+        With tags the question comes from those topics only: a single tag, a
+        list of tags with equal shares, or a dict of tag -> share for a
+        weighted mix. A topic is picked by its share among those with enabled
+        questions, then a question from that topic's sampler, so a draw costs
+        O(log n) however large the bank is.
+        """
+        if tags is None:
+            slot = self.sampler.sample()
+            if slot is None:
+                return None
+            return self.questions[slot]
+
+        tag = self.pick_topic(tags)
+        if tag is None:
+            return None
+        slot = self.tag_samplers[tag].sample()
+        if slot is None:
+            return None
+        return self.tag_questions[tag][slot]
+
+
+    def topic_shares(self, tags):
+        """
+        Returns tag -> share for the given topics that have enabled questions.
+
+        Topics are a single tag, a list of tags with equal shares, or a dict of tag -> share.
+        """
+        if isinstance(tags, str):
+            tags = [tags]
+        shares = tags if isinstance(tags, dict) else dict.fromkeys(tags, 1)
+        return {tag: share for tag, share in shares.items() if share > 0 and self.tag_enabled.get(tag)}
+
+
+    def pick_topic(self, tags, rng=random):
+        """
+        Picks one of the given topics in proportion to its share, among those with enabled questions.
+        """
+        shares = self.topic_shares(tags)
+        if not shares:
+            return None
+        return rng.choices(list(shares), weights=list(shares.values()))[0]
+
+
+    def count_enabled(self, tags=None):
+        """
+        Returns the number of enabled questions, or of those with any of the given tags.
+        """
+        if tags is None:
+            return self.enabled_count
+        if isinstance(tags, str):
+            tags = [tags]
+        elif isinstance(tags, dict):
+            tags = [tag for tag, share in tags.items() if share > 0]
+        enabled_sets = [self.tag_enabled.get(tag, set()) for tag in tags]
+        if len(enabled_sets) == 1:
+            return len(enabled_sets[0])
+        return len(set().union(*enabled_sets))
+
+
     def add_question_from_input(self):
         """
         Adds a question to the list based on user input.
@@ -184,6 +616,10 @@ class QuestionManager:
                 question = Question(is_quiz=False)
                 question.set_question_text(question_text)
                 question.set_answer(answer)
+                if not self.read_tags(question):
+                    continue
+                if not self.confirm_duplicate(question):
+                    continue
                 self.add_question_to_list(question)
                 print("Question added successfully.")
 
@@ -205,8 +641,11 @@ class QuestionManager:
                 question.add_option(option1, is_correct=correct_answer_index=="1")
                 question.add_option(option2, is_correct=correct_answer_index=="2")
                 question.add_option(option3, is_correct=correct_answer_index=="3")
-                
+                if not self.read_tags(question):
+                    continue
 
+                if not self.confirm_duplicate(question):
+                    continue
                 self.add_question_to_list(question)
                 print("Question added successfully.")
 
@@ -218,6 +657,38 @@ class QuestionManager:
                 print("Invalid choice. Please try again.")
 
 
+    def read_tags(self, question):
+        """
+        Asks for the optional tags of a new question. Returns False if they are invalid.
+        """
+        tags = input("Enter tags separated by commas (optional): ")
+        try:
+            question.set_tags(tags)
+        except ValueError as error:
+            print(error)
+            return False
+        return True
+
+
+    def confirm_duplicate(self, question):
+        """
+        Warns about existing questions with the same text and options and asks whether to add it anyway.
+        """
+        duplicates = self.search_index.find_duplicates(question)
+        if not duplicates:
+            return True
+        print(f"A question with the same text already exists (ID {', '.join(str(question_id) for question_id in duplicates)}).")
+        while True:
+            confirm = input("Add it anyway? (y/n): ")
+            if confirm.lower() == "y":
+                return True
+            elif confirm.lower() == "n":
+                print("Question not added.")
+                return False
+            else:
+                print("Invalid input. Please enter 'y' or 'n'.")
+
+
     def get_random_question(self):
         """
         Returns a random question from the list based on the weights.
@@ -245,59 +716,162 @@ class QuestionManager:
             question.question_id = 1
         else:
             question.question_id = self.questions[-1].question_id + 1
+        # Logged before indexing: storages that assign IDs (SQLite) replace the one picked above
+        self.storage.record_change("add", question)
         self.questions.append(question)
-        self.save_questions()
+        self.question_positions[question.question_id] = len(self.questions) - 1
+        self.sampler.append(question.weight if question.enabled else 0)
+        if question.enabled:
+            self.enabled_count += 1
+            self.enabled_questions = None
+        self.add_to_tag_samplers(question)
+        self.scheduler.reschedule(question)
+        self.search_index.add(question)
+        if self.storage.needs_compaction():
+            self.save_questions()
+
+
+    def add_questions(self, questions):
+        """
+        Adds many questions at once: IDs are assigned in one go, the index and
+        sampler are extended, and the bank is written once instead of per question.
+        Storages that assign IDs insert the questions in one transaction instead.
+        """
+        if self.storage.assigns_ids:
+            self.storage.record_changes("add", questions)
+        else:
+            next_id = self.questions[-1].question_id + 1 if self.questions else 1
+            for offset, question in enumerate(questions):
+                question.question_id = next_id + offset
+        for offset, question in enumerate(questions):
+            self.question_positions[question.question_id] = len(self.questions) + offset
+        self.questions.extend(questions)
+        for question in questions:
+            self.search_index.add(question)
+        self.assign_question_ids()
+        self.rebuild_sampler()
+        if not self.storage.assigns_ids:
+            self.save_questions()
 
 
-    def load_questions(self):
-        """
-        Loads questions from the file and adds them to the list.
-        """
-        self.questions = []  # Clear the existing questions
-        if os.path.isfile(self.file_path):
-            with open(self.file_path, 'r') as file:
-                lines = file.readlines()
-                for line in lines:
-                    question_data = line.strip().split('|')
-                    question_id = int(question_data[0])
-                    is_quiz = question_data[-1] == 'QuizQuestion'
-                    question = Question(is_quiz)
-                    question.question_id = question_id
-                    question.enabled = question_data[1] == 'True'
-                    question.question_text = question_data[2]
-                    if is_quiz:
-                        question.answer = question_data[-2]
-                        question.answer_options = question_data[3].split(',')
-                    else:
-                        question.answer = question_data[3]
-                    self.questions.append(question)
+    def load_questions(self, rebuild_sampler=True):
+        """
+        Loads questions from the storage and adds them to the list.
+        """
+        with METRICS.timer("load_questions"):
+            self.questions = self.storage.load_questions(self.question_class)
+        self.rebuild_index()
         self.assign_question_ids()
+        if rebuild_sampler:
+            self.rebuild_sampler()
+
+
+    def load_statistics(self):
+        """
+        Loads the statistics from the storage onto the questions and rebuilds the sampler with their weights.
+        """
+        with METRICS.timer("load_statistics"):
+            self.storage.load_statistics(self)
+        self.rebuild_sampler()
+
+
+    def save_statistics(self):
+        """
+        Saves the statistics of every question to the storage.
+        """
+        with METRICS.timer("save_statistics"):
+            self.storage.save_statistics(self.questions)
+
+
+    def record_change(self, operation, question):
+        """
+        Records a change to a single question, saving all questions once the storage asks for it.
+        """
+        self.storage.record_change(operation, question)
+        if self.storage.needs_compaction():
+            self.save_questions()
+
+
+    def record_changes(self, operation, questions):
+        """
+        Records the same change to many questions with one storage write.
+        """
+        self.storage.record_changes(operation, questions)
+        if self.storage.needs_compaction():
+            self.save_questions()
+
+
+    def record_answer(self, question):
+        """
+        Records the new weight and statistics of a question after it was answered.
+        """
+        METRICS.increment("answers")
+        self.storage.record_answer(question)
+
+
+    def commit_changes(self):
+        """
+        Makes the answers recorded so far durable.
+        """
+        self.storage.commit()
 
 
     def save_questions(self):
         """
-        Saves the questions to the file.
+        Saves the questions to the storage.
+        """
+        with METRICS.timer("save_questions"):
+            self.storage.save_questions(self.questions)
+
+
+    def export_bank(self, storage):
+        """
+        Writes all questions and their statistics to another storage, e.g. to convert between formats.
         """
-        with open(self.file_path, 'w') as file:
-            for question in self.questions:
-                file.write(str(question) + '\n')
+        storage.save_questions(self.questions)
+        storage.save_statistics(self.questions)
     
 
     def get_question_by_id(self, question_id):
         """
         Retrieves a question from the list based on its ID.
         """
-        for question in self.questions:
-            if question.question_id == question_id:
-                return question
-        return None
+        index = self.question_positions.get(question_id)
+        if index is None:
+            return None
+        return self.questions[index]
     
 
-    def get_enabled_questions(self):
+    def get_random_enabled_question(self, rng=random):
+        """
+        Draws an enabled question uniformly, from the cached list of enabled questions.
+        """
+        if self.enabled_questions is None:
+            self.enabled_questions = [question for question in self.questions if question.enabled]
+        if not self.enabled_questions:
+            return None
+        return rng.choice(self.enabled_questions)
+
+
+    def get_enabled_questions(self, tags=None):
         """
-        Retrieves a list of enabled questions.
+        Retrieves a list of enabled questions, or of those with any of the given tags.
+        Topics given a share of 0 are left out.
+
+        The full list is cached until a question is added, enabled or
+        disabled; tagged lists come from the per-tag enabled sets, so neither
+        filters the whole bank on every call.
         """
-        return [question for question in self.questions if question.enabled]
+        if tags is None:
+            if self.enabled_questions is None:
+                self.enabled_questions = [question for question in self.questions if question.enabled]
+            return list(self.enabled_questions)
+        if isinstance(tags, str):
+            tags = [tags]
+        elif isinstance(tags, dict):
+            tags = [tag for tag, share in tags.items() if share > 0]
+        question_ids = set().union(*(self.tag_enabled.get(tag, set()) for tag in tags))
+        return [self.get_question_by_id(question_id) for question_id in sorted(question_ids)]
 
 
     def toggle_question_status(self):
@@ -319,8 +893,8 @@ class QuestionManager:
                 while True:
                     confirm = input("Are you sure you want to toggle the status of this question? (y/n): ")
                     if confirm.lower() == "y":
-                        question.enabled = not question.enabled
-                        self.save_questions()
+                        self.set_question_enabled(question, not question.enabled)
+                        self.record_change("enabled", question)
                         print("Question status toggled successfully.")
                         break
                     elif confirm.lower() == "n":
@@ -333,6 +907,51 @@ class QuestionManager:
             break
 
 
+    def search_questions(self, query, prefix=True):
+        """
+        Returns the questions whose text or options contain every word of the query.
+        """
+        return [self.get_question_by_id(question_id) for question_id in self.search_index.search(query, prefix)]
+
+
+    def set_questions_enabled(self, questions, enabled):
+        """
+        Enables or disables many questions, logging all changes with one write. Returns how many changed.
+        """
+        changed = [question for question in questions if question.enabled != enabled]
+        for question in changed:
+            self.set_question_enabled(question, enabled)
+        self.record_changes("enabled", changed)
+        return len(changed)
+
+
+    def set_enabled_by_query(self, query, enabled):
+        """
+        Enables or disables every question containing all words of the query. Returns how many changed.
+        """
+        return self.set_questions_enabled(self.search_questions(query, prefix=False), enabled)
+
+
+    def search_from_input(self, page_size=20):
+        """
+        Searches questions by keyword and optionally enables or disables all matches.
+        """
+        query = input("Enter words to search for: ")
+        matches = self.search_questions(query)
+        print(f"{len(matches)} matching question(s).")
+        if not matches:
+            return
+        print("ID | Active | Question Text")
+        for question in matches[:page_size]:
+            print(f"{question.question_id} | {'Yes' if question.enabled else 'No'} | {question.question_text}")
+        if len(matches) > page_size:
+            print(f"... and {len(matches) - page_size} more.")
+        choice = input("'e' enable all matches, 'd' disable all matches, Enter to return: ").strip().lower()
+        if choice in ("e", "d"):
+            changed = self.set_questions_enabled(matches, choice == "e")
+            print(f"{changed} question(s) {'enabled' if choice == 'e' else 'disabled'}.")
+
+
     def delete_all_questions(self):
         """
         Deletes all questions from the list.
@@ -342,13 +961,12 @@ class QuestionManager:
             if confirm.lower() == "y":
                 self.questions = []
                 Question.next_id = 1
+                self.rebuild_index()
                 self.reset_weights()  # Reset weights to 1 for all questions
-                self.save_questions()
+                self.storage.delete_all_questions()
                 self.update_probabilities()
                 
-                # Clear statistics file
-                with open('statistics.txt', 'w') as statistics_file:
-                    statistics_file.truncate(0)  # Delete all content of the file
+                self.storage.clear_statistics()
                 
                 print("All questions have been deleted.")
                 break
@@ -365,6 +983,20 @@ class QuestionManager:
         """
         for question in self.questions:
             question.weight = 1
+        self.rebuild_sampler()
+
+
+    def toggle_profiling(self, profiler):
+        """
+        Starts profiling, or stops it and writes the profile report and the metrics.
+        """
+        if not profiler.is_running():
+            profiler.start()
+            print("Profiling started.")
+            return
+        report_path = profiler.stop()
+        METRICS.dump()
+        print(f"Profile written to {report_path}, metrics written to metrics.txt.")
 
 
     def run(self):
@@ -373,14 +1005,12 @@ class QuestionManager:
         """
         print("\nWelcome to the Interactive Learning Tool!\n")
 
-        if os.path.isfile(self.file_path):
-            self.load_questions()
+        if self.questions:
             print("Questions loaded successfully.")
 
-        practice_mode = PracticeMode(self)
-        test_mode = TestMode(self)
-        statistics_view = StatisticsMode(self)
-        statistics_view.load_statistics()
+        profiler = Profiler()
+        if profiling_requested():
+            profiler.start()
 
         while True:
             print("\n--- Menu ---")
@@ -391,51 +1021,56 @@ class QuestionManager:
             print("5. Test Mode")
             print("6. Statistics Viewing Mode")
             print("7. Exit")
+            print("8. " + ("Stop Profiling" if profiler.is_running() else "Start Profiling"))
+            print("9. Search Questions")
             choice = input("Enter your choice: ")
 
             if choice == "1":
                 self.add_question_from_input()
-                self.save_questions()
 
             elif choice == "2":
                 self.toggle_question_status()
-                self.save_questions()
 
             elif choice == "3":
                 self.delete_all_questions()
-                self.save_questions()
 
             elif choice == "4":
-                practice_mode.practice_mode()
-                practice_mode = PracticeMode(self)
+                from practice_test import PracticeMode
+                PracticeMode(self).practice_mode()
 
             elif choice == "5":
-                test_mode.test_mode()
-                test_mode = TestMode(self)
+                from practice_test import TestMode
+                TestMode(self).test_mode()
 
             elif choice == "6":
-                statistics_view.statistics_view()
+                self.statistics_view.statistics_view()
 
             elif choice == "7":
                 break
 
+            elif choice == "8":
+                self.toggle_profiling(profiler)
+
+            elif choice == "9":
+                self.search_from_input()
+
             else:
                 print("Invalid choice. Please try again.")
 
-        self.statistics_view.save_statistics()
+        self.save_questions()
+        self.save_statistics()
+        if profiler.is_running():
+            self.toggle_profiling(profiler)
+        if os.environ.get("QUIZ_METRICS"):
+            METRICS.dump(os.environ["QUIZ_METRICS"])
 
         print("\nGoodbye! Thank you for using the Interactive Learning Tool.\n")
 
 
     def main(self):
-        if os.path.isfile("questions.txt"):
-            self.load_questions()
-            self.statistics_view.load_statistics()
-
+        # The constructor has already loaded the questions and statistics, and run saves them on exit.
         self.run()
 
-        self.statistics_view.save_statistics()
-
 
 if __name__ == "__main__":
     manager = QuestionManager()
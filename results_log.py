@@ -0,0 +1,156 @@
+import os
+import json
+import time
+import struct
+import datetime
+
+from persistence import append_durable, write_atomic
+
+
+INDEX_ENTRY = struct.Struct("=dQ")  # timestamp, byte offset of the record in the log
+
+
+class ResultsLog:
+    """
+    Append-only log of test results with per-question outcomes.
+
+    Each result is one JSON line in the log. A fixed-width index of
+    (timestamp, offset) entries lets "last N" and date-range queries seek
+    straight to the matching records, and a small aggregates file keeps
+    daily score totals and per-question test accuracy up to date, so those
+    questions are answered without reading the history at all.
+    """
+
+    def __init__(self, file_path="results.jsonl"):
+        self.file_path = file_path
+        self.index_path = file_path + ".idx"
+        self.aggregates_path = file_path + ".agg"
+        self.aggregates = None
+
+
+    def append(self, score_percentage, num_correct, num_questions, outcomes=(), timestamp=None):
+        """
+        Records one test. Outcomes are (question_id, correct, response_seconds) tuples.
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        record = {
+            "timestamp": timestamp,
+            "percentage": round(score_percentage, 2),
+            "correct": num_correct,
+            "questions": num_questions,
+            "outcomes": [[question_id, bool(correct), round(response_seconds, 3)] for question_id, correct, response_seconds in outcomes],
+        }
+        line = json.dumps(record).encode('utf-8') + b'\n'
+        offset = append_durable(self.file_path, line)
+        append_durable(self.index_path, INDEX_ENTRY.pack(timestamp, offset))
+        self.update_aggregates(record)
+
+
+    def load_aggregates(self):
+        """
+        Reads the rolling aggregates, starting empty if there are none yet.
+        """
+        if self.aggregates is None:
+            self.aggregates = {"days": {}, "questions": {}}
+            if os.path.isfile(self.aggregates_path):
+                with open(self.aggregates_path, 'r') as file:
+                    self.aggregates = json.load(file)
+        return self.aggregates
+
+
+    def update_aggregates(self, record):
+        """
+        Folds one record into the daily and per-question totals and saves them.
+        """
+        aggregates = self.load_aggregates()
+        day = datetime.date.fromtimestamp(record["timestamp"]).isoformat()
+        tests, percentage_sum = aggregates["days"].get(day, (0, 0.0))
+        aggregates["days"][day] = (tests + 1, percentage_sum + record["percentage"])
+        for question_id, correct, _ in record["outcomes"]:
+            shown, correct_count = aggregates["questions"].get(str(question_id), (0, 0))
+            aggregates["questions"][str(question_id)] = (shown + 1, correct_count + int(correct))
+
+        write_atomic(self.aggregates_path, json.dumps(aggregates), checksum=False)  # Changes with every test
+
+
+    def count(self):
+        """
+        Returns the number of recorded tests.
+        """
+        if not os.path.isfile(self.index_path):
+            return 0
+        return os.path.getsize(self.index_path) // INDEX_ENTRY.size
+
+
+    def read_records(self, first, last):
+        """
+        Returns the records with positions first..last-1 in the log.
+        """
+        if first >= last:
+            return []
+        with open(self.index_path, 'rb') as index:
+            index.seek(first * INDEX_ENTRY.size)
+            _, offset = INDEX_ENTRY.unpack(index.read(INDEX_ENTRY.size))
+        records = []
+        with open(self.file_path, 'rb') as file:
+            file.seek(offset)
+            for _ in range(last - first):
+                records.append(json.loads(file.readline()))
+        return records
+
+
+    def find_position(self, timestamp):
+        """
+        Binary-searches the index for the first record at or after timestamp.
+
+        Records are appended in time order, so the index is sorted.
+        """
+        low, high = 0, self.count()
+        if high == 0:
+            return 0
+        with open(self.index_path, 'rb') as index:
+            while low < high:
+                middle = (low + high) // 2
+                index.seek(middle * INDEX_ENTRY.size)
+                middle_timestamp, _ = INDEX_ENTRY.unpack(index.read(INDEX_ENTRY.size))
+                if middle_timestamp < timestamp:
+                    low = middle + 1
+                else:
+                    high = middle
+        return low
+
+
+    def last_results(self, count):
+        """
+        Returns the most recent `count` test records, oldest first.
+        """
+        total = self.count()
+        return self.read_records(max(total - count, 0), total)
+
+
+    def results_between(self, start, end):
+        """
+        Returns the test records with start <= timestamp < end.
+        """
+        return self.read_records(self.find_position(start), self.find_position(end))
+
+
+    def score_trend(self, start_day, end_day):
+        """
+        Returns (day, tests, average percentage) for every day with tests between the two dates, inclusive.
+        """
+        days = self.load_aggregates()["days"]
+        trend = []
+        for day in sorted(days):
+            if start_day.isoformat() <= day <= end_day.isoformat():
+                tests, percentage_sum = days[day]
+                trend.append((day, tests, percentage_sum / tests))
+        return trend
+
+
+    def question_accuracy(self, question_id):
+        """
+        Returns (times asked in tests, times answered correctly) for a question.
+        """
+        shown, correct = self.load_aggregates()["questions"].get(str(question_id), (0, 0))
+        return shown, correct
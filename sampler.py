@@ -0,0 +1,125 @@
+import random
+
+
+class WeightedSampler:
+    """
+    Fenwick (binary indexed) tree over question weights.
+
+    Each slot holds the weight of one question. Updating a weight and drawing a
+    weighted random slot both cost O(log n) and do not allocate.
+    """
+
+    def __init__(self, weights=()):
+        self.rebuild(weights)
+
+
+    def __len__(self):
+        return len(self.values)
+
+
+    def rebuild(self, weights):
+        """
+        Rebuilds the tree from scratch in O(n).
+        """
+        self.values = [float(weight) for weight in weights]
+        size = len(self.values)
+        self.tree = [0.0] + self.values
+        for index in range(1, size + 1):
+            parent = index + (index & -index)
+            if parent <= size:
+                self.tree[parent] += self.tree[index]
+        self.top_bit = 1 << (size.bit_length() - 1) if size else 0
+        self.pending_updates = 0
+
+
+    def prefix_sum(self, count):
+        """
+        Returns the sum of the first `count` weights.
+        """
+        total = 0.0
+        while count > 0:
+            total += self.tree[count]
+            count -= count & -count
+        return total
+
+
+    def total(self):
+        """
+        Returns the sum of all weights.
+        """
+        return self.prefix_sum(len(self.values))
+
+
+    def append(self, weight):
+        """
+        Adds a new slot at the end and returns its index.
+        """
+        weight = float(weight)
+        index = len(self.values) + 1
+        lowest_bit = index & -index
+        self.values.append(weight)
+        self.tree.append(weight + self.prefix_sum(index - 1) - self.prefix_sum(index - lowest_bit))
+        if index >= self.top_bit << 1:
+            self.top_bit = index
+        return index - 1
+
+
+    def update(self, slot, weight):
+        """
+        Sets the weight of a slot.
+        """
+        weight = float(weight)
+        delta = weight - self.values[slot]
+        if delta == 0:
+            return
+        self.values[slot] = weight
+        size = len(self.values)
+        index = slot + 1
+        while index <= size:
+            self.tree[index] += delta
+            index += index & -index
+
+        # Repeated float deltas drift; an occasional O(n) rebuild keeps the
+        # amortized update cost at O(log n).
+        self.pending_updates += 1
+        if self.pending_updates > max(size, 1024):
+            self.rebuild(self.values)
+
+
+    def find(self, target):
+        """
+        Returns the slot whose cumulative weight range contains `target`.
+        """
+        size = len(self.values)
+        position = 0
+        step = self.top_bit
+        while step:
+            candidate = position + step
+            if candidate <= size and self.tree[candidate] <= target:
+                position = candidate
+                target -= self.tree[candidate]
+            step >>= 1
+        return position
+
+
+    def sample(self, rng=random):
+        """
+        Returns a slot chosen with probability proportional to its weight, or
+        None if every weight is zero.
+        """
+        total = self.total()
+        if total <= 0:
+            return None
+        slot = self.find(rng.random() * total)
+        if slot < len(self.values) and self.values[slot] > 0:
+            return slot
+
+        # Rounding pushed us onto an empty slot; resync and try once more.
+        self.rebuild(self.values)
+        slot = self.find(rng.random() * self.total())
+        if slot < len(self.values) and self.values[slot] > 0:
+            return slot
+        for slot in range(len(self.values) - 1, -1, -1):
+            if self.values[slot] > 0:
+                return slot
+        return None
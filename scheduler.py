@@ -0,0 +1,135 @@
+import time
+import heapq
+
+
+class WeightedScheduler:
+    """
+    The original policy: draw questions at random in proportion to their
+    weight, lowering the weight after a correct answer and raising it after
+    a wrong one.
+    """
+
+    correct_factor = 0.8
+    incorrect_factor = 1.2
+
+    def __init__(self, question_manager):
+        self.question_manager = question_manager
+
+
+    def rebuild(self):
+        """
+        The manager's sampler already tracks the weights, so there is nothing to rebuild.
+        """
+
+
+    def reschedule(self, question):
+        """
+        The manager's sampler already tracks the weights, so there is nothing to update.
+        """
+
+
+    def next_question(self, tags=None):
+        """
+        Draws an enabled question with probability proportional to its weight, from the given topics if any.
+        """
+        return self.question_manager.get_weighted_enabled_question(tags)
+
+
+    def record_answer(self, question, correct):
+        """
+        Adjusts the weight of the question after it was answered.
+        """
+        factor = self.correct_factor if correct else self.incorrect_factor
+        self.question_manager.set_question_weight(question, question.weight * factor)
+
+
+class LeitnerScheduler:
+    """
+    Leitner-box spaced repetition.
+
+    A correct answer moves a question up one box and a wrong answer sends it
+    back to the first; each box has a longer review interval. Due times are
+    kept in a heap with lazy deletion, so finding the next due question is
+    O(log n). When nothing is due yet the earliest upcoming question is used.
+    Boxes are kept on the questions and saved with their statistics, so
+    intervals carry over between sessions.
+
+    With topics, a topic is picked by its share and its earliest due
+    question is used; that scans the topic's enabled questions, so it costs
+    O(k) for a topic of k questions.
+    """
+
+    intervals = [0, 60, 10 * 60, 60 * 60, 24 * 60 * 60, 3 * 24 * 60 * 60]  # seconds per box
+
+    def __init__(self, question_manager):
+        self.question_manager = question_manager
+        self.due_times = {}  # question_id -> due time of its live heap entry
+        self.heap = []
+
+
+    def due_time(self, question):
+        """
+        Returns when a question is next due, based on its box and when it was last seen.
+        """
+        if question.last_seen is None:
+            return 0
+        return question.last_seen + self.intervals[min(question.box, len(self.intervals) - 1)]
+
+
+    def rebuild(self):
+        """
+        Rebuilds the heap from the enabled questions in O(n).
+        """
+        self.due_times = {}
+        self.heap = []
+        for question in self.question_manager.questions:
+            if question.enabled:
+                due = self.due_time(question)
+                self.due_times[question.question_id] = due
+                self.heap.append((due, question.question_id))
+        heapq.heapify(self.heap)
+
+
+    def reschedule(self, question):
+        """
+        Puts an added or re-enabled question back in the heap.
+        """
+        if question.enabled:
+            due = self.due_time(question)
+            self.due_times[question.question_id] = due
+            heapq.heappush(self.heap, (due, question.question_id))
+
+
+    def next_question(self, tags=None):
+        """
+        Returns the enabled question with the earliest due time, from the given topics if any.
+        """
+        if tags is not None:
+            tag = self.question_manager.pick_topic(tags)
+            if tag is None:
+                return None
+            question_id = min(self.question_manager.tag_enabled[tag], key=lambda question_id: (self.due_times.get(question_id, 0), question_id))
+            return self.question_manager.get_question_by_id(question_id)
+        while self.heap:
+            due, question_id = self.heap[0]
+            question = self.question_manager.get_question_by_id(question_id)
+            if question is not None and question.enabled and self.due_times.get(question_id) == due:
+                return question
+            heapq.heappop(self.heap)  # Stale entry for a rescheduled, disabled or deleted question
+        return None
+
+
+    def record_answer(self, question, correct):
+        """
+        Moves the question to its new box and schedules its next review.
+        """
+        question.box = min(question.box + 1, len(self.intervals) - 1) if correct else 0
+        if question.last_seen is None:
+            question.last_seen = time.time()
+        self.reschedule(question)
+
+
+SCHEDULERS = {
+    "weighted": WeightedScheduler,
+    "leitner": LeitnerScheduler,
+}
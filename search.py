@@ -0,0 +1,136 @@
+import re
+import bisect
+
+
+WORD = re.compile(r"\w+")
+
+
+def tokenize(text):
+    """
+    Splits text into case-folded words.
+    """
+    return WORD.findall(text.casefold())
+
+
+class SearchIndex:
+    """
+    Inverted index from words of question text and options to question IDs.
+
+    Keyword queries intersect posting sets, starting with the smallest, and
+    the last word of a query can match as a prefix through a sorted
+    vocabulary. A second map from each question's normalized text and
+    options catches duplicates when questions are added. The index is built
+    on first use, so startup does not pay for it, and is then kept up to
+    date as questions are added or deleted.
+    """
+
+    def __init__(self, question_manager):
+        self.question_manager = question_manager
+        self.postings = None       # word -> set of question IDs; None until built
+        self.signatures = {}       # normalized text and options -> set of question IDs
+        self.vocabulary = []       # sorted words, for prefix lookups
+        self.vocabulary_dirty = False
+
+
+    def signature(self, question):
+        """
+        Returns what two questions must share to count as duplicates.
+        """
+        return (" ".join(tokenize(question.question_text)),) + tuple(" ".join(tokenize(option)) for option in question.answer_options)
+
+
+    def ensure_built(self):
+        """
+        Builds the index from all questions the first time it is needed.
+        """
+        if self.postings is None:
+            self.postings = {}
+            self.signatures = {}
+            for question in self.question_manager.questions:
+                self.index_question(question)
+            self.vocabulary = sorted(self.postings)
+            self.vocabulary_dirty = False
+
+
+    def index_question(self, question):
+        """
+        Adds one question's words and signature.
+        """
+        question_id = question.question_id
+        words = tokenize(question.question_text)
+        for option in question.answer_options:
+            words.extend(tokenize(option))
+        for word in words:
+            posting = self.postings.get(word)
+            if posting is None:
+                self.postings[word] = {question_id}
+                self.vocabulary_dirty = True
+            else:
+                posting.add(question_id)
+        self.signatures.setdefault(self.signature(question), set()).add(question_id)
+
+
+    def add(self, question):
+        """
+        Indexes a new question, if the index has been built already.
+        """
+        if self.postings is not None:
+            self.index_question(question)
+
+
+    def clear(self):
+        """
+        Drops the index; it is rebuilt from the questions on next use.
+        """
+        self.postings = None
+        self.signatures = {}
+        self.vocabulary = []
+
+
+    def words_with_prefix(self, prefix):
+        """
+        Returns the indexed words that start with prefix.
+        """
+        if self.vocabulary_dirty:
+            self.vocabulary = sorted(self.postings)
+            self.vocabulary_dirty = False
+        words = []
+        for index in range(bisect.bisect_left(self.vocabulary, prefix), len(self.vocabulary)):
+            if not self.vocabulary[index].startswith(prefix):
+                break
+            words.append(self.vocabulary[index])
+        return words
+
+
+    def search(self, query, prefix=True):
+        """
+        Returns the IDs of the questions containing every word of the query, in ID order.
+
+        With prefix, the last word also matches longer words it starts, so
+        results can be shown while a word is still being typed.
+        """
+        self.ensure_built()
+        words = tokenize(query)
+        if not words:
+            return []
+        postings = [self.postings.get(word, set()) for word in (words[:-1] if prefix else words)]
+        if prefix:
+            matches = set()
+            for word in self.words_with_prefix(words[-1]):
+                matches |= self.postings[word]
+            postings.append(matches)
+        postings.sort(key=len)
+        result = set(postings[0])
+        for posting in postings[1:]:
+            result &= posting
+            if not result:
+                break
+        return sorted(result)
+
+
+    def find_duplicates(self, question):
+        """
+        Returns the IDs of other questions with the same text and options, ignoring case and punctuation.
+        """
+        self.ensure_built()
+        return sorted(self.signatures.get(self.signature(question), set()) - {question.question_id})
@@ -0,0 +1,274 @@
+import sys
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+
+from question import QuestionManager
+from practice_test import TestMode
+from learners import LearnerState, LearnerStore
+from grading import GRADERS
+
+
+HELP = "Commands: HELLO <name>, PRACTICE, TEST <n>, NEXT, ANSWER <text>, STATS, QUIT"
+
+
+class Connection:
+    """
+    What one connected client is doing: which learner, which mode and which question is open.
+    """
+
+    def __init__(self):
+        self.learner = None
+        self.mode = None
+        self.question = None
+        self.test_questions = []
+        self.test_score = 0
+        self.test_size = 0
+
+
+class LearningServer:
+    """
+    Line-oriented TCP server for practice and test sessions.
+
+    All learners share one in-memory question bank; each learner's weights
+    and statistics are kept in their own LearnerState. With a LearnerStore
+    the state is read from the learner's shard at login, written back when
+    they leave and dropped from memory once their last connection is gone;
+    without one it stays in memory for the life of the server. Every
+    command gets exactly one response line.
+    """
+
+    def __init__(self, question_manager, learner_store=None):
+        self.question_manager = question_manager
+        self.learner_store = learner_store
+        self.test_mode = TestMode(question_manager)
+        self.learners = {}
+        self.connection_counts = {}  # user -> connections logged in as that learner
+
+
+    def get_learner(self, user):
+        """
+        Returns the state of a learner for a new connection, loading it on first login.
+        """
+        learner = self.learners.get(user)
+        if learner is None:
+            if self.learner_store is None:
+                learner = LearnerState(user, self.question_manager)
+            else:
+                learner = self.learner_store.load(user, self.question_manager)
+            self.learners[user] = learner
+        self.connection_counts[user] = self.connection_counts.get(user, 0) + 1
+        return learner
+
+
+    def save_learner(self, connection):
+        """
+        Writes the state of the connection's learner to their shard and logs the connection out.
+
+        The learner is dropped from memory when this was their last connection.
+        """
+        learner = connection.learner
+        if learner is None:
+            return
+        learner.save()
+        connection.learner = None
+        connection.mode = None
+        connection.question = None
+        user = learner.user
+        self.connection_counts[user] -= 1
+        if self.connection_counts[user] == 0:
+            del self.connection_counts[user]
+            if self.learner_store is not None:
+                del self.learners[user]
+
+
+    def format_question(self, question):
+        """
+        Renders a question on one line.
+        """
+        line = f"QUESTION {question.question_id}: {question.question_text}"
+        if question.is_quiz:
+            options = " ".join(f"{index + 1}) {option}" for index, option in enumerate(question.answer_options))
+            line += f" | {options}"
+        return line
+
+
+    def next_question(self, connection):
+        """
+        Moves the connection to its next question, or finishes the test.
+        """
+        if connection.mode == "practice":
+            connection.question = connection.learner.next_question()
+            if connection.question is None:
+                return "ERROR no active questions"
+        elif connection.test_questions:
+            connection.question = self.question_manager.get_question_by_id(connection.test_questions.pop())
+        else:
+            connection.mode = None
+            connection.question = None
+            percentage = (connection.test_score / connection.test_size) * 100
+            return f"SCORE {percentage:.2f}% {connection.test_score}/{connection.test_size}"
+        return self.format_question(connection.question)
+
+
+    def handle_command(self, connection, line):
+        """
+        Executes one command line and returns the response line.
+        """
+        command, _, argument = line.strip().partition(" ")
+        command = command.upper()
+
+        if command == "HELLO":
+            if not argument:
+                return "ERROR HELLO needs a name"
+            self.save_learner(connection)
+            connection.learner = self.get_learner(argument)
+            return f"OK hello {argument}"
+        if command == "QUIT":
+            self.save_learner(connection)
+            return "BYE"
+        if connection.learner is None:
+            return "ERROR say HELLO <name> first"
+
+        if command == "PRACTICE":
+            if self.question_manager.enabled_count < 5:
+                return "ERROR at least 5 active questions are required for practice mode"
+            connection.mode = "practice"
+            return self.next_question(connection)
+        if command == "TEST":
+            try:
+                size = int(argument)
+                if size < 5:
+                    return "ERROR minimum 5 questions are required for a test"
+                connection.test_questions = self.test_mode.generate_tests(1, size)[0]
+            except ValueError as error:
+                return f"ERROR {error}"
+            connection.mode = "test"
+            connection.test_score = 0
+            connection.test_size = size
+            return self.next_question(connection)
+        if command == "NEXT":
+            if connection.mode is None:
+                return "ERROR start PRACTICE or TEST first"
+            return self.next_question(connection)
+        if command == "ANSWER":
+            question = connection.question
+            if question is None:
+                return "ERROR no open question"
+            correct = self.question_manager.grader.grade(question, argument)
+            connection.question = None
+            connection.learner.record_answer(question, correct)
+            if connection.mode == "test" and correct:
+                connection.test_score += 1
+            if correct:
+                return "CORRECT"
+            if question.is_quiz and question.get_correct_option_index() is not None:
+                return f"WRONG the correct option is {question.get_correct_option_index() + 1}"
+            return f"WRONG the correct answer is {question.answer}"
+        if command == "STATS":
+            shown, correct = connection.learner.totals()
+            return f"STATS shown {shown} correct {correct}"
+        return f"ERROR unknown command. {HELP}"
+
+
+    async def handle_client(self, reader, writer):
+        """
+        Serves one client until it quits or disconnects.
+        """
+        connection = Connection()
+        writer.write(f"OK {HELP}\n".encode())
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                response = self.handle_command(connection, line.decode("utf-8", "replace"))
+                writer.write(response.encode() + b"\n")
+                await writer.drain()
+                if response == "BYE":
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            self.save_learner(connection)
+            writer.close()
+
+
+    async def serve(self, host="127.0.0.1", port=8765):
+        """
+        Listens for clients forever.
+        """
+        server = await asyncio.start_server(self.handle_client, host, port)
+        async with server:
+            await server.serve_forever()
+
+
+async def run_client(host, port, user, rounds):
+    """
+    Stand-in learner: logs in and answers `rounds` practice questions with random option numbers.
+
+    Returns the number of round trips made.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    await reader.readline()  # Greeting
+
+    async def request(line):
+        writer.write(line.encode() + b"\n")
+        await writer.drain()
+        return (await reader.readline()).decode().strip()
+
+    await request(f"HELLO {user}")
+    requests = 1
+    response = await request("PRACTICE")
+    requests += 1
+    for _ in range(rounds):
+        if not response.startswith("QUESTION"):
+            break
+        await request(f"ANSWER {random.randint(1, 3)}")
+        response = await request("NEXT")
+        requests += 2
+    await request("QUIT")
+    writer.close()
+    return requests + 1
+
+
+async def load_test(question_manager, clients, rounds, host="127.0.0.1", port=8765):
+    """
+    Starts a server and runs many stand-in clients against it at once.
+
+    Learner shards go to a temporary directory that is removed afterwards.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        learning_server = LearningServer(question_manager, LearnerStore(directory))
+        server = await asyncio.start_server(learning_server.handle_client, host, port)
+        async with server:
+            started = time.perf_counter()
+            counts = await asyncio.gather(*(run_client(host, port, f"learner{number}", rounds) for number in range(clients)))
+            elapsed = time.perf_counter() - started
+    total = sum(counts)
+    print(f"{clients} clients, {total} requests in {elapsed:.2f}s ({total / elapsed:.0f} requests/s)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve practice and test sessions to many learners over TCP.")
+    parser.add_argument("--bank", default="questions.txt", help="question bank to serve")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--grading", choices=sorted(GRADERS), default="exact", help="how free-form answers are checked")
+    parser.add_argument("--learners", default="learners", help="directory of per-learner statistics shards")
+    parser.add_argument("--load-test", type=int, metavar="CLIENTS", help="run this many stand-in clients against a local server and exit")
+    parser.add_argument("--rounds", type=int, default=100, help="practice questions per stand-in client")
+    args = parser.parse_args(argv)
+
+    question_manager = QuestionManager(args.bank, grading=args.grading)
+    if args.load_test:
+        asyncio.run(load_test(question_manager, args.load_test, args.rounds, args.host, args.port))
+    else:
+        print(f"Serving {len(question_manager.questions)} questions on {args.host}:{args.port}")
+        asyncio.run(LearningServer(question_manager, LearnerStore(args.learners)).serve(args.host, args.port))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,234 @@
+import json
+import sqlite3
+import pathlib
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS questions (
+    question_id INTEGER PRIMARY KEY,
+    enabled INTEGER NOT NULL,
+    is_quiz INTEGER NOT NULL,
+    question_text TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    answer_options TEXT NOT NULL,
+    weight REAL NOT NULL DEFAULT 1,
+    shown_count INTEGER NOT NULL DEFAULT 0,
+    correct_count INTEGER NOT NULL DEFAULT 0,
+    last_seen REAL,
+    tags TEXT NOT NULL DEFAULT '[]',
+    box INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS questions_enabled ON questions (enabled);
+"""
+
+
+class SQLiteStorage:
+    """
+    Storage backend that keeps questions and statistics in a SQLite database.
+
+    Every change is a row-level update. Answers are written inside an open
+    transaction that is committed in batches, and counters are stored as
+    increments, so several sessions can share one bank without overwriting
+    each other's statistics.
+    """
+
+    extensions = (".db", ".sqlite", ".sqlite3")
+    assigns_ids = True  # Added questions get their ID from the database, so sessions never reuse one
+
+    def __init__(self, file_path, batch_size=50, read_only=False):
+        self.file_path = file_path
+        self.batch_size = batch_size
+        self.pending_answers = 0
+        self.persisted_counts = {}  # question_id -> (shown_count, correct_count) last written
+        if read_only:
+            # Loading only; the schema is left as the writing sessions created it
+            self.connection = sqlite3.connect(pathlib.Path(file_path).absolute().as_uri() + "?mode=ro", timeout=30, uri=True)
+            return
+        self.connection = sqlite3.connect(file_path, timeout=30)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(questions)")]
+        if "last_seen" not in columns:
+            self.connection.execute("ALTER TABLE questions ADD COLUMN last_seen REAL")
+        if "tags" not in columns:
+            self.connection.execute("ALTER TABLE questions ADD COLUMN tags TEXT NOT NULL DEFAULT '[]'")
+        if "box" not in columns:
+            self.connection.execute("ALTER TABLE questions ADD COLUMN box INTEGER NOT NULL DEFAULT 0")
+
+
+    def question_row(self, question):
+        """
+        Converts a question to the column values of its row.
+        """
+        return (
+            question.question_id,
+            int(question.enabled),
+            int(question.is_quiz),
+            question.question_text,
+            question.answer,
+            json.dumps(question.answer_options),
+            question.weight,
+            question.shown_count,
+            question.correct_count,
+            question.last_seen,
+            json.dumps(question.tags),
+            question.box,
+        )
+
+
+    def load_questions(self, question_class):
+        """
+        Loads every question with its statistics.
+        """
+        questions = []
+        self.persisted_counts = {}
+        rows = self.connection.execute(
+            "SELECT question_id, enabled, is_quiz, question_text, answer, answer_options,"
+            " weight, shown_count, correct_count, last_seen, tags, box FROM questions ORDER BY question_id")
+        for question_id, enabled, is_quiz, question_text, answer, answer_options, weight, shown_count, correct_count, last_seen, tags, box in rows:
+            question = question_class(bool(is_quiz))
+            question.question_id = question_id
+            question.enabled = bool(enabled)
+            question.question_text = question_text
+            question.answer = answer
+            question.answer_options = json.loads(answer_options)
+            question.weight = weight
+            question.shown_count = shown_count
+            question.correct_count = correct_count
+            question.last_seen = last_seen
+            question.tags = json.loads(tags)
+            question.box = box
+            self.persisted_counts[question_id] = (shown_count, correct_count)
+            questions.append(question)
+        return questions
+
+
+    def record_change(self, operation, question):
+        """
+        Writes an added question or an enabled flag and commits it.
+        """
+        self.record_changes(operation, [question])
+
+
+    def record_changes(self, operation, questions):
+        """
+        Writes the same kind of change for many questions in one transaction.
+        """
+        for question in questions:
+            self.write_change(operation, question)
+        self.commit()
+
+
+    def write_change(self, operation, question):
+        """
+        Writes one added question or enabled flag into the open transaction.
+        """
+        if operation == "add":
+            cursor = self.connection.execute("INSERT INTO questions VALUES (NULL, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", self.question_row(question)[1:])
+            question.question_id = cursor.lastrowid
+            self.persisted_counts[question.question_id] = (question.shown_count, question.correct_count)
+        elif operation == "enabled":
+            self.connection.execute("UPDATE questions SET enabled = ? WHERE question_id = ?", (int(question.enabled), question.question_id))
+
+
+    def record_answer(self, question):
+        """
+        Writes the weight and counter changes of one answered question.
+
+        The statement joins the open transaction, which is committed every
+        batch_size answers or when commit is called.
+        """
+        shown_count, correct_count = self.persisted_counts.get(question.question_id, (0, 0))
+        self.connection.execute(
+            "UPDATE questions SET weight = ?, box = ?, shown_count = shown_count + ?, correct_count = correct_count + ?,"
+            " last_seen = COALESCE(MAX(last_seen, ?), ?, last_seen) WHERE question_id = ?",
+            (question.weight, question.box, question.shown_count - shown_count, question.correct_count - correct_count,
+             question.last_seen, question.last_seen, question.question_id))
+        self.persisted_counts[question.question_id] = (question.shown_count, question.correct_count)
+        self.pending_answers += 1
+        if self.pending_answers >= self.batch_size:
+            self.commit()
+
+
+    def commit(self):
+        """
+        Commits the open transaction.
+        """
+        self.connection.commit()
+        self.pending_answers = 0
+
+
+    def needs_compaction(self):
+        """
+        Rows are updated individually, so there is never anything to compact.
+        """
+        return False
+
+
+    def save_questions(self, questions):
+        """
+        Inserts the given questions that are not in the table yet, with their statistics.
+
+        Existing rows are left alone: adds and toggles are already written by
+        record_change, and rewriting rows from this session's copy would undo
+        other sessions' toggles or bring back questions they deleted.
+        """
+        new_questions = [question for question in questions if question.question_id not in self.persisted_counts]
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO questions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (self.question_row(question) for question in new_questions))
+        for question in new_questions:
+            self.persisted_counts[question.question_id] = (question.shown_count, question.correct_count)
+        self.pending_answers = 0
+
+
+    def delete_all_questions(self):
+        """
+        Deletes every question of the bank, including those added by other sessions.
+        """
+        with self.connection:
+            self.connection.execute("DELETE FROM questions")
+        self.persisted_counts = {}
+        self.pending_answers = 0
+
+
+    def load_statistics(self, question_manager):
+        """
+        Copies the stored weights and counters onto the corresponding questions.
+        """
+        rows = self.connection.execute("SELECT question_id, weight, shown_count, correct_count, last_seen, box FROM questions")
+        for question_id, weight, shown_count, correct_count, last_seen, box in rows:
+            question = question_manager.get_question_by_id(question_id)
+            if question is not None:
+                question.weight = weight
+                question.shown_count = shown_count
+                question.correct_count = correct_count
+                question.last_seen = last_seen
+                question.box = box
+                self.persisted_counts[question_id] = (shown_count, correct_count)
+
+
+    def save_statistics(self, questions):
+        """
+        Writes any counter changes not recorded yet and commits them.
+        """
+        for question in questions:
+            if self.persisted_counts.get(question.question_id) != (question.shown_count, question.correct_count):
+                self.record_answer(question)
+        self.commit()
+
+
+    def clear_statistics(self):
+        """
+        Statistics are stored with the questions, so clearing the table clears them too.
+        """
+
+
+    def close(self):
+        """
+        Commits pending answers and closes the connection.
+        """
+        self.commit()
+        self.connection.close()
@@ -1,4 +1,120 @@
-import os
+import heapq
+
+from metrics import METRICS
+
+try:
+    import numpy
+except ImportError:  # NumPy is optional; the engine falls back to plain Python
+    numpy = None
+
+
+class StatisticsEngine:
+    """
+    Column-oriented snapshot of question statistics.
+
+    Shown counts, correct counts, weights and enabled flags are copied into
+    arrays once, and percentages, rankings, histograms and totals are computed
+    over whole columns. With NumPy installed every pass is vectorized.
+    """
+
+    def __init__(self, questions):
+        count = len(questions)
+        if numpy is not None:
+            self.shown = numpy.fromiter((question.shown_count for question in questions), dtype=numpy.int64, count=count)
+            self.correct = numpy.fromiter((question.correct_count for question in questions), dtype=numpy.int64, count=count)
+            self.weight = numpy.fromiter((question.weight for question in questions), dtype=numpy.float64, count=count)
+            self.enabled = numpy.fromiter((question.enabled for question in questions), dtype=bool, count=count)
+        else:
+            self.shown = [question.shown_count for question in questions]
+            self.correct = [question.correct_count for question in questions]
+            self.weight = [question.weight for question in questions]
+            self.enabled = [question.enabled for question in questions]
+        self.cached_percentages = None
+
+
+    def __len__(self):
+        return len(self.shown)
+
+
+    def percentages(self):
+        """
+        Returns the correct percentage of every question (0 for questions never shown).
+        """
+        if self.cached_percentages is None:
+            if numpy is not None:
+                percentages = numpy.zeros(len(self.shown))
+                numpy.divide(self.correct * 100.0, self.shown, out=percentages, where=self.shown > 0)
+            else:
+                percentages = [(correct / shown) * 100 if shown else 0.0 for shown, correct in zip(self.shown, self.correct)]
+            self.cached_percentages = percentages
+        return self.cached_percentages
+
+
+    def select(self, enabled=None, min_shown=0):
+        """
+        Returns the rows matching the filters, in bank order.
+        """
+        if numpy is not None:
+            mask = self.shown >= min_shown
+            if enabled is not None:
+                mask &= self.enabled == enabled
+            return numpy.flatnonzero(mask).tolist()
+        return [row for row in range(len(self.shown))
+                if self.shown[row] >= min_shown and (enabled is None or self.enabled[row] == enabled)]
+
+
+    def hardest(self, limit=10, min_shown=1):
+        """
+        Returns up to `limit` rows with the lowest correct percentage among questions shown at least `min_shown` times.
+        """
+        percentages = self.percentages()
+        rows = self.select(min_shown=min_shown)
+        if numpy is not None:
+            rows = numpy.asarray(rows, dtype=numpy.int64)
+            order = numpy.lexsort((-self.shown[rows], percentages[rows]))  # Lowest %, then most shown
+            return rows[order[:limit]].tolist()
+        return heapq.nsmallest(limit, rows, key=lambda row: (percentages[row], -self.shown[row]))
+
+
+    def most_shown(self, limit=10):
+        """
+        Returns up to `limit` rows with the highest shown count.
+        """
+        if numpy is not None:
+            return numpy.argsort(-self.shown, kind="stable")[:limit].tolist()
+        return heapq.nlargest(limit, range(len(self.shown)), key=lambda row: self.shown[row])
+
+
+    def histogram(self, bins=10):
+        """
+        Counts shown questions per correct-percentage bucket of equal width between 0 and 100.
+        """
+        percentages = self.percentages()
+        if numpy is not None:
+            counts, _ = numpy.histogram(percentages[self.shown > 0], bins=bins, range=(0, 100))
+            return counts.tolist()
+        counts = [0] * bins
+        for shown, percentage in zip(self.shown, percentages):
+            if shown:
+                counts[min(int(percentage * bins / 100), bins - 1)] += 1
+        return counts
+
+
+    def summary(self):
+        """
+        Returns bank-wide totals.
+        """
+        total = numpy.sum if numpy is not None else sum
+        shown = int(total(self.shown))
+        correct = int(total(self.correct))
+        return {
+            "questions": len(self.shown),
+            "enabled": int(total(self.enabled)),
+            "shown": shown,
+            "correct": correct,
+            "correct_percentage": (correct / shown) * 100 if shown else 0.0,
+        }
+
 
 class StatisticsMode:
     def __init__(self, question_manager):
@@ -6,32 +122,57 @@ class StatisticsMode:
 
 
 
-    def statistics_view(self):
+    def statistics_view(self, page_size=20):
         """
-        Displays the statistics of each question.
+        Displays the statistics of each question, one page at a time.
         """
+        METRICS.increment("statistics_views")
+        engine = StatisticsEngine(self.question_manager.questions)
+        summary = engine.summary()
         print("\n--- Statistics Viewing Mode ---")
+        print(f"Questions: {summary['questions']} ({summary['enabled']} active) | Shown: {summary['shown']} | "
+              f"Correct: {summary['correct']} | Correct %: {summary['correct_percentage']:.2f}%")
+
+        rows = range(len(engine))
+        offset = 0
+        while True:
+            self.print_rows(engine, rows[offset:offset + page_size])
+            offset += page_size
+            has_more = offset < len(rows)
+            choice = input(("'n' next page, " if has_more else "") + "'h' hardest, 'm' most shown, Enter to return: ").strip().lower()
+            if choice == "n" and has_more:
+                continue
+            elif choice == "h":
+                rows, offset = engine.hardest(page_size), 0
+            elif choice == "m":
+                rows, offset = engine.most_shown(page_size), 0
+            else:
+                break
+
+
+    def print_rows(self, engine, rows):
+        """
+        Prints the statistics table for the given engine rows.
+        """
+        questions = self.question_manager.questions
+        percentages = engine.percentages()
         print("ID | Active | Question Text | Shown | Correct | Correct %")
         print("------------------------------------------------------------")
-        for question in self.question_manager.questions:
+        for row in rows:
+            question = questions[row]
             active_status = "Yes" if question.enabled else "No"
-            question_text = question.question_text
-            shown_count = question.shown_count
-            correct_count = question.correct_count
-            correct_percentage = question.get_correct_percentage()
-
-            print(f"{question.question_id} | {active_status} | {question_text} | {shown_count} | {correct_count} | {correct_percentage:.2f}%")
+            print(f"{question.question_id} | {active_status} | {question.question_text} | {question.shown_count} | "
+                  f"{question.correct_count} | {percentages[row]:.2f}%")
 
 
     def get_shown_count(self, question_id):
         """
         Returns the total shown count of a question.
         """
-        total_count = 0
-        for question in self.question_manager.questions:
-            if question.question_id == question_id:
-                total_count += question.weight
-        return total_count
+        question = self.question_manager.get_question_by_id(question_id)
+        if question is None:
+            return 0
+        return question.weight
     
 
     def calculate_correct_percentage(self, shown_count, correct_count):
@@ -45,52 +186,13 @@ class StatisticsMode:
 
     def load_statistics(self):
         """
-        Loads the statistics from the statistics file and updates the corresponding questions.
-        """
-        statistics_file_path = "statistics.txt"
-        if os.path.isfile(statistics_file_path):
-            with open(statistics_file_path, 'r') as file:
-                lines = file.readlines()
-                for line in lines:
-                    statistics_data = line.strip().split('|')
-                    question_id = int(statistics_data[0])
-                    enabled = statistics_data[1] == 'True'
-                    question_text = statistics_data[2]
-                    shown_count = int(statistics_data[3])
-                    correct_count = int(statistics_data[4]) if statistics_data[4] else 0
-                    # Compute the percentage of correct answers
-                    correct_percentage = (correct_count / shown_count) * 100 if shown_count > 0 else 0
-
-                    # Find the corresponding question and update the statistics
-                    for question in self.question_manager.questions:
-                        if question.question_id == question_id:
-                            question.enabled = enabled
-                            question.question_text = question_text
-                            question.shown_count = shown_count
-                            question.correct_count = correct_count
-                            question.correct_percentage = correct_percentage
-                            break
+        Loads the statistics from the storage and updates the corresponding questions.
+        """
+        self.question_manager.load_statistics()
 
 
     def save_statistics(self):
         """
-        Saves the statistics of each question to the statistics file.
-        """
-        statistics_file_path = "statistics.txt"
-        with open(statistics_file_path, 'w') as file:
-            for question in self.question_manager.questions:
-                # Calculate the correct percentage and round it
-                correct_percentage = self.calculate_correct_percentage(question.shown_count, question.correct_count)
-                correct_percentage = round(correct_percentage, 2)
-                
-                question_data = [
-                    question.question_id,
-                    'True' if question.enabled else 'False',
-                    question.question_text,
-                    question.shown_count,
-                    question.correct_count,
-                    correct_percentage  # Add the rounded correct percentage to the data
-                ]
-                file.write('|'.join(str(data) for data in question_data) + '\n')
-
-
+        Saves the statistics of each question to the storage.
+        """
+        self.question_manager.save_statistics()
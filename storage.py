@@ -0,0 +1,455 @@
+import os
+import gc
+import sys
+import locale
+import marshal
+import threading
+from collections import OrderedDict
+
+from journal import QuestionJournal
+from persistence import BackgroundWriter, atomic_open, encode_text, write_atomic
+from columnar import ColumnarStorage
+from sqlite_storage import SQLiteStorage
+
+
+QUESTION_TYPES = ("QuizQuestion", "FreeformQuestion")
+
+
+def split_question_line(line):
+    """
+    Splits a line of the questions file into its fields and its tags.
+
+    Tags were added later as an optional last field after the question type.
+    """
+    question_data = line.strip().split('|')
+    tags = question_data.pop().split(',') if question_data[-1] not in QUESTION_TYPES else ()
+    return question_data, tags
+
+
+class TextStorage:
+    """
+    Stores questions and statistics in the pipe-delimited text files.
+
+    Questions live in a snapshot file plus an append-only change log;
+    statistics live in a separate file that is rewritten on save. Answers
+    mark the statistics dirty and a background writer rewrites the file a
+    few seconds later, so a crash loses at most the last few answers.
+
+    A read_only storage loads without repairing the change log or writing
+    the snapshot cache, so processes that only read the bank never write to it.
+    """
+
+    assigns_ids = False
+
+    def __init__(self, file_path="questions.txt", statistics_path="statistics.txt", read_only=False):
+        self.file_path = file_path
+        self.statistics_path = statistics_path
+        self.read_only = read_only
+        self.journal = QuestionJournal(file_path)
+        self.cache = SnapshotCache(file_path)
+        self.source = None  # Open LazySource while lazily loaded questions point into the file
+        self.questions = None  # The list last loaded or saved, flushed by the background writer
+        self.lock = threading.RLock()  # Guards the files against the background writer
+        self.writer = BackgroundWriter(self.flush_statistics)
+
+
+    def parse_question(self, line, question_class):
+        """
+        Creates a question from one line of the questions file.
+        """
+        question_data, tags = split_question_line(line)
+        question_id = int(question_data[0])
+        is_quiz = question_data[-1] == 'QuizQuestion'
+        question = question_class(is_quiz)
+        question.question_id = question_id
+        question.enabled = question_data[1] == 'True'
+        question.question_text = question_data[2]
+        if is_quiz:
+            question.answer = question_data[-2]
+            question.answer_options = question_data[3].split(',')
+        else:
+            question.answer = question_data[3]
+        if tags:
+            question.tags = tags
+        return question
+
+
+    def index_questions(self, question_class):
+        """
+        Streams the questions file and creates lazy questions that only know
+        their ID, status, type, tags and the offset of their line.
+        """
+        questions = []
+        self.source = LazySource(self.file_path)
+        offset = 0
+        for line in self.source.file:
+            question_id, enabled, _ = line.split(b'|', 2)
+            rest, _, last = line.rstrip().rpartition(b'|')
+            if last in (b'QuizQuestion', b'FreeformQuestion'):
+                question_type, tags = last, ()
+            else:
+                question_type, tags = rest.rpartition(b'|')[2], last.decode(self.source.encoding).split(',')
+            questions.append(question_class(question_type == b'QuizQuestion', self.source, offset, int(question_id), enabled == b'True', tags))
+            offset += len(line)
+        return questions
+
+
+    def load_questions(self, question_class):
+        """
+        Loads the snapshot and applies the changes logged since it was written.
+
+        With a lazy question class only an offset index of the snapshot is
+        built; text, answers and options are read when first used.
+        """
+        questions = []
+        self.close_source()
+        if os.path.isfile(self.file_path):
+            if getattr(question_class, "lazy", False):
+                questions = self.index_questions(question_class)
+            else:
+                questions = self.cache.load(question_class)
+                if questions is None:
+                    with open(self.file_path, 'r') as file:
+                        questions = [self.parse_question(line, question_class) for line in file]
+                    if not self.read_only:
+                        self.cache.save(questions)
+
+        positions = {question.question_id: index for index, question in enumerate(questions)}
+        for operation, payload in self.journal.read_entries(repair=not self.read_only):
+            if operation == "add":
+                question = self.parse_question(payload, question_class)
+                if question.question_id in positions:
+                    questions[positions[question.question_id]] = question
+                else:
+                    positions[question.question_id] = len(questions)
+                    questions.append(question)
+            elif operation == "enabled":
+                question_id, enabled = payload.split('|')
+                index = positions.get(int(question_id))
+                if index is not None:
+                    questions[index].enabled = enabled == 'True'
+        self.questions = questions
+        return questions
+
+
+    def change_entry(self, operation, question):
+        """
+        Returns the change log entry for a question change.
+        """
+        if operation == "add":
+            return (operation, question)
+        return (operation, question.question_id, question.enabled)
+
+
+    def record_change(self, operation, question):
+        """
+        Logs a single question change.
+        """
+        self.record_changes(operation, [question])
+
+
+    def record_changes(self, operation, questions):
+        """
+        Logs the same kind of change for many questions with one write.
+        """
+        if operation in ("add", "enabled"):
+            self.journal.append_many(self.change_entry(operation, question) for question in questions)
+
+
+    def record_answer(self, question):
+        """
+        Marks the statistics dirty; the background writer saves them shortly.
+        """
+        self.writer.mark_dirty()
+
+
+    def commit(self):
+        """
+        Saves any statistics the background writer has not saved yet.
+        """
+        self.writer.flush()
+
+
+    def flush_statistics(self):
+        """
+        Rewrites the statistics file from the questions last loaded or saved.
+        """
+        if self.questions is not None:
+            self.save_statistics(self.questions)
+
+
+    def needs_compaction(self):
+        """
+        Checks if the logged changes should be folded into the snapshot.
+        """
+        return self.journal.needs_compaction()
+
+
+    def save_questions(self, questions):
+        """
+        Saves the questions to the file and clears the change log.
+
+        The snapshot is written atomically through a temporary file, and not
+        at all when it is unchanged, so an interrupted save never leaves a
+        truncated questions file behind.
+        """
+        with self.lock:
+            lines = self.write_questions(questions)
+        self.questions = questions
+        if self.source is None and lines:
+            # Cache what the file parses back to; only a few questions need parsing to find out
+            self.cache.save([question if self.round_trips(question) else self.parse_question(line, type(question))
+                             for line, question in zip(lines, questions)])
+
+
+    def round_trips(self, question):
+        """
+        Checks if a question reads back from its line as it is in memory.
+
+        Options are joined with commas, so an option containing one, or a
+        quiz question without options, comes back differently.
+        """
+        return not question.is_quiz or (question.answer_options and not any(',' in option for option in question.answer_options))
+
+
+    def write_questions(self, questions):
+        """
+        Writes the snapshot file and points lazy questions at it.
+
+        Returns the lines written, or None if the file was unchanged.
+        """
+        lines = [f"{question}\n" for question in questions]
+        if self.source is None:
+            written = write_atomic(self.file_path, "".join(lines))
+        else:
+            # Lazy questions point into the old file; move them over to the new one.
+            offsets = []
+            offset = 0
+            for line in lines:
+                offsets.append(offset)
+                offset += len(encode_text(line, self.source.encoding))
+            self.source.close()
+            written = write_atomic(self.file_path, "".join(lines), encoding=self.source.encoding)
+            self.source = LazySource(self.file_path)
+            for question, offset in zip(questions, offsets):
+                if getattr(question, "source", None) is not None:
+                    question.rebind(self.source, offset)
+        self.journal.clear()
+        return lines if written else None
+
+
+    def delete_all_questions(self):
+        """
+        Empties the questions file.
+        """
+        self.save_questions([])
+
+
+    def load_statistics(self, question_manager):
+        """
+        Loads the statistics from the statistics file and updates the corresponding questions.
+
+        Enabled flags come from the questions file and its change log, which
+        record every toggle durably; the enabled column here may be older.
+        """
+        if os.path.isfile(self.statistics_path):
+            with open(self.statistics_path, 'r') as file:
+                for line in file:
+                    statistics_data = line.strip().split('|')
+                    question_id = int(statistics_data[0])
+                    question_text = statistics_data[2]
+                    shown_count = int(statistics_data[3])
+                    correct_count = int(statistics_data[4]) if statistics_data[4] else 0
+                    # Weight, last seen time and Leitner box were added later; older files stop at the percentage
+                    weight = float(statistics_data[6]) if len(statistics_data) > 6 else 1
+                    last_seen = float(statistics_data[7]) if len(statistics_data) > 7 and statistics_data[7] else None
+                    box = int(statistics_data[8]) if len(statistics_data) > 8 else 0
+
+                    # Find the corresponding question and update the statistics
+                    question = question_manager.get_question_by_id(question_id)
+                    if question is not None:
+                        if getattr(question, "source", None) is None:
+                            question.question_text = question_text  # Lazy questions keep reading the questions file
+                        question.shown_count = shown_count
+                        question.correct_count = correct_count
+                        question.weight = weight
+                        question.last_seen = last_seen
+                        question.box = box
+
+
+    def save_statistics(self, questions):
+        """
+        Saves the statistics of each question to the statistics file.
+
+        The file is written to a temporary file and renamed over the old one,
+        so the background writer never leaves a half-written file behind, and
+        it is left alone when nothing changed.
+        """
+        with self.lock:
+            self.write_statistics(questions)
+
+
+    def write_statistics(self, questions):
+        """
+        Writes one statistics line per question.
+        """
+        lines = []
+        for question in questions:
+            # Calculate the correct percentage and round it
+            correct_percentage = round(question.get_correct_percentage(), 2)
+
+            question_data = [
+                question.question_id,
+                'True' if question.enabled else 'False',
+                question.question_text,
+                question.shown_count,
+                question.correct_count,
+                correct_percentage,  # Add the rounded correct percentage to the data
+                question.weight,
+                '' if question.last_seen is None else question.last_seen,
+                question.box
+            ]
+            lines.append('|'.join(str(data) for data in question_data) + '\n')
+        write_atomic(self.statistics_path, "".join(lines))
+
+
+    def clear_statistics(self):
+        """
+        Deletes all content of the statistics file.
+        """
+        with self.lock:
+            write_atomic(self.statistics_path, "")
+
+
+    def close(self):
+        """
+        Flushes pending statistics and closes the file lazily loaded questions read from.
+        """
+        self.writer.close()
+        self.close_source()
+
+
+    def close_source(self):
+        """
+        Closes the file lazily loaded questions read from.
+        """
+        if self.source is not None:
+            self.source.close()
+            self.source = None
+
+
+class SnapshotCache:
+    """
+    Parsed copy of a questions file, so startup can skip parsing it.
+
+    Holds the cache_state of every question in marshal format next to the
+    questions file. It is only used while the questions file has the
+    modification time and size it was built from, and by the same Python
+    version (marshal data is version specific); otherwise the file is
+    parsed again and the cache rewritten.
+    """
+
+    def __init__(self, questions_file_path):
+        self.questions_file_path = questions_file_path
+        self.file_path = questions_file_path + ".cache"
+
+
+    def key(self):
+        """
+        Identifies the current questions file contents.
+        """
+        stat = os.stat(self.questions_file_path)
+        return (sys.version_info[:2], stat.st_mtime_ns, stat.st_size)
+
+
+    def load(self, question_class):
+        """
+        Returns the cached questions, or None if the cache is missing or out of date.
+        """
+        gc_enabled = gc.isenabled()
+        gc.disable()  # Only acyclic objects are created; collections during the load would just scan them
+        try:
+            with open(self.file_path, 'rb') as file:
+                key, states = marshal.loads(file.read())  # Much faster than marshal.load on the file object
+            if tuple(key) != self.key():
+                return None
+            return [question_class.from_cache_state(state) for state in states]
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+
+    def save(self, questions):
+        """
+        Writes the cache for the current questions file.
+        """
+        try:
+            with atomic_open(self.file_path, 'wb') as file:
+                marshal.dump((self.key(), [question.cache_state() for question in questions]), file)
+        except OSError:
+            pass  # The cache only speeds up startup; the questions file is what counts
+
+
+class LazySource:
+    """
+    Open handle on a questions file that lazy questions load their text from.
+
+    At most max_loaded questions keep their text in memory; loading another
+    one unloads the least recently loaded.
+    """
+
+    def __init__(self, file_path, max_loaded=10000):
+        self.file = open(file_path, 'rb')
+        self.encoding = locale.getpreferredencoding(False)  # What open() uses to write the file
+        self.max_loaded = max_loaded
+        self.loaded = OrderedDict()
+        self.lock = threading.Lock()  # The background writer reads question text too
+
+
+    def load(self, question):
+        """
+        Reads the line of a lazy question and fills in its text, answer and options.
+        """
+        with self.lock:
+            self.file.seek(question.offset)
+            line = self.file.readline()
+        question_data, _ = split_question_line(line.decode(self.encoding))
+        if question.is_quiz:
+            question.materialize(question_data[2], question_data[-2], question_data[3].split(','))
+        else:
+            question.materialize(question_data[2], question_data[3], ())
+
+        self.loaded[id(question)] = question
+        if len(self.loaded) > self.max_loaded:
+            _, oldest = self.loaded.popitem(last=False)
+            oldest.unload()
+
+
+    def forget(self, question):
+        """
+        Stops tracking a question that was unloaded elsewhere.
+        """
+        self.loaded.pop(id(question), None)
+
+
+    def close(self):
+        """
+        Closes the file handle.
+        """
+        self.loaded.clear()
+        self.file.close()
+
+
+def open_storage(file_path, statistics_path="statistics.txt", read_only=False):
+    """
+    Picks the storage backend from the extension of the question bank path.
+
+    A read_only storage can load the bank but must not be used to change it.
+    """
+    if file_path.endswith(ColumnarStorage.extension):
+        return ColumnarStorage(file_path, read_only)
+    if file_path.endswith(SQLiteStorage.extensions):
+        return SQLiteStorage(file_path, read_only=read_only)
+    return TextStorage(file_path, statistics_path, read_only)
@@ -1,6 +1,22 @@
+import os
+import time
+import datetime
+import tempfile
 import unittest
 from question import Question, QuestionManager
-from stats import StatisticsMode
+from stats import StatisticsMode, StatisticsEngine
+import practice_test
+from sampler import WeightedSampler
+from storage import open_storage
+from results_log import ResultsLog
+from server import LearningServer, Connection
+from learners import LearnerStore
+import benchmark
+from metrics import METRICS, Metrics
+import bulk
+from grading import FuzzyGrader
+import batch_grading
+import persistence
 
 class TestQuizApp(unittest.TestCase):
 
@@ -10,6 +26,10 @@ class TestQuizApp(unittest.TestCase):
         question.answer = "4"
         self.assertEqual(question.question_text, "What's 2+2?")
         self.assertEqual(question.answer, "4")
+        other = Question(True)
+        question.answer_options = ["3", "4"]
+        other.answer_options = ["3", "4"]
+        self.assertIs(question.answer_options, other.answer_options)      #equal option tuples are stored once
 
     def test_question_manager(self):        #tests questions loading
         manager = QuestionManager()
@@ -24,6 +44,529 @@ class TestQuizApp(unittest.TestCase):
             self.assertTrue(question.shown_count >= 0)      #non negative value
             self.assertTrue(question.correct_count >= 0)
 
+    def test_weighted_sampler(self):
+        sampler = WeightedSampler([1, 0, 3])
+        sampler.append(0)
+        self.assertAlmostEqual(sampler.total(), 4)
+        sampler.update(0, 0)
+        for _ in range(100):
+            self.assertEqual(sampler.sample(), 2)   #only slot with weight left
+        sampler.update(2, 0)
+        self.assertIsNone(sampler.sample())
+
+    def test_change_log_replay(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, "questions.txt")
+            manager = QuestionManager(file_path)
+            question = Question()
+            question.set_question_text("1+1")
+            question.set_answer("2")
+            manager.add_question_to_list(question)
+            with open(manager.storage.journal.file_path, 'a') as file:
+                file.write("add|2|True|torn")     #interrupted write
+            reloaded = QuestionManager(file_path)
+            self.assertEqual([q.question_text for q in reloaded.questions], ["1+1"])
+            reloaded.save_questions()
+            self.assertFalse(os.path.exists(manager.storage.journal.file_path))
+            statistics_path = os.path.join(directory, "statistics.txt")
+            manager = QuestionManager(file_path, statistics_path)
+            manager.save_statistics()
+            manager.set_question_enabled(manager.questions[0], False)
+            manager.record_change("enabled", manager.questions[0])     #logged, statistics file not rewritten
+            self.assertFalse(QuestionManager(file_path, statistics_path).questions[0].enabled)
+
+    def test_question_index(self):
+        with tempfile.TemporaryDirectory() as directory:
+            manager = QuestionManager(os.path.join(directory, "questions.txt"))
+            for text in ["1+1", "2+2"]:
+                question = Question()
+                question.set_question_text(text)
+                question.set_answer("x")
+                manager.add_question_to_list(question)
+            self.assertEqual(manager.get_question_by_id(2).question_text, "2+2")
+            self.assertIsNone(manager.get_question_by_id(3))
+
+    def test_columnar_round_trip(self):
+        with tempfile.TemporaryDirectory() as directory:
+            manager = QuestionManager(os.path.join(directory, "questions.txt"), os.path.join(directory, "statistics.txt"))
+            question = Question(True)
+            question.set_question_text("Pick one")
+            question.add_option("a, b", is_correct=True)
+            question.add_option("c")
+            question.shown_count = 3
+            manager.add_question_to_list(question)
+            bank_path = os.path.join(directory, "bank.qbank")
+            manager.export_bank(open_storage(bank_path))
+
+            bank = QuestionManager(bank_path)
+            loaded = bank.get_question_by_id(1)
+            self.assertEqual(list(loaded.answer_options), ["a, b", "c"])      #commas survive
+            self.assertEqual(loaded.get_correct_option_index(), 0)
+            self.assertEqual(loaded.shown_count, 3)
+            bank.storage.close()
+
+            lazy = QuestionManager(bank_path, lazy=True)
+            loaded = lazy.get_question_by_id(1)
+            self.assertFalse(loaded.is_slot_set("question_text"))      #only decoded on first use
+            self.assertEqual(list(loaded.answer_options), ["a, b", "c"])
+            lazy.save_questions()
+            self.assertEqual(lazy.get_question_by_id(1).question_text, "Pick one")     #rebound to the rewritten file
+            lazy.storage.close()
+
+    def test_sqlite_sessions_share_counts(self):
+        with tempfile.TemporaryDirectory() as directory:
+            bank_path = os.path.join(directory, "bank.db")
+            manager = QuestionManager(bank_path)
+            question = Question()
+            question.set_question_text("1+1")
+            question.set_answer("2")
+            manager.add_question_to_list(question)
+            other = QuestionManager(bank_path)
+            for session in (manager, other):
+                session.get_question_by_id(1).shown_count += 1
+                session.record_answer(session.get_question_by_id(1))
+                session.commit_changes()
+            reloaded = QuestionManager(bank_path)
+            self.assertEqual(reloaded.get_question_by_id(1).shown_count, 2)    #neither session overwrote the other
+            for session, text in ((manager, "2+2"), (other, "3+3")):
+                added = Question()
+                added.set_question_text(text)
+                added.set_answer("x")
+                session.add_question_to_list(added)
+                session.get_question_by_id(1).shown_count += 1
+                session.record_answer(session.get_question_by_id(1))
+                session.commit_changes()
+            for session in (other, manager):     #both exit, as run() does
+                session.save_questions()
+                session.save_statistics()
+            reloaded = QuestionManager(bank_path)
+            self.assertEqual(reloaded.get_question_by_id(1).shown_count, 4)
+            self.assertEqual([q.question_text for q in reloaded.questions], ["1+1", "2+2", "3+3"])     #no shared IDs, nothing deleted
+            reloaded.set_question_enabled(reloaded.get_question_by_id(1), False)
+            reloaded.record_change("enabled", reloaded.get_question_by_id(1))
+            reloaded.commit_changes()
+            other.save_questions()
+            other.save_statistics()
+            self.assertFalse(QuestionManager(bank_path).get_question_by_id(1).enabled)     #toggle of another session kept
+            reloaded.storage.delete_all_questions()
+            manager.save_questions()
+            manager.save_statistics()
+            self.assertEqual(QuestionManager(bank_path).questions, [])     #deleted questions stay deleted
+            for session in (manager, other, reloaded):
+                session.storage.close()
+
+    def test_weights_persist_with_statistics(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file_paths = (os.path.join(directory, "questions.txt"), os.path.join(directory, "statistics.txt"))
+            manager = QuestionManager(*file_paths)
+            question = Question()
+            question.set_question_text("1+1")
+            question.set_answer("2")
+            manager.add_question_to_list(question)
+            manager.set_question_weight(question, 0.64)
+            question.last_seen = 1700000000.5
+            manager.statistics_view.save_statistics()
+
+            reloaded = QuestionManager(*file_paths).get_question_by_id(1)
+            self.assertEqual(reloaded.weight, 0.64)
+            self.assertEqual(reloaded.last_seen, 1700000000.5)
+
+    def test_leitner_scheduler(self):
+        with tempfile.TemporaryDirectory() as directory:
+            manager = QuestionManager(os.path.join(directory, "questions.txt"), scheduler="leitner")
+            for text in ["1+1", "2+2"]:
+                question = Question()
+                question.set_question_text(text)
+                question.set_answer("x")
+                manager.add_question_to_list(question)
+            first = manager.scheduler.next_question()
+            manager.scheduler.record_answer(first, True)
+            second = manager.scheduler.next_question()
+            self.assertNotEqual(first.question_id, second.question_id)
+            manager.set_question_enabled(second, False)
+            self.assertEqual(manager.scheduler.next_question().question_id, first.question_id)
+
+            statistics_path = os.path.join(directory, "statistics.txt")
+            for path in (os.path.join(directory, "questions.txt"), os.path.join(directory, "bank.qbank"), os.path.join(directory, "bank.db")):
+                manager.export_bank(open_storage(path, statistics_path))
+                reloaded = QuestionManager(path, statistics_path, scheduler="leitner")
+                self.assertEqual(reloaded.get_question_by_id(first.question_id).box, 1)     #boxes survive a restart
+                self.assertEqual(reloaded.scheduler.due_time(reloaded.get_question_by_id(first.question_id)), first.last_seen + 60)
+                reloaded.storage.close()
+
+    def test_batch_tests(self):
+        manager = QuestionManager()
+        test_mode = practice_test.TestMode(manager)
+        forms = test_mode.generate_tests(20, 5, seed=1, stratify=True)
+        self.assertEqual(forms, test_mode.generate_tests(20, 5, seed=1, stratify=True))    #seeded forms repeat
+        for form in forms:
+            self.assertEqual(len(set(form)), 5)
+        question = manager.questions[0]
+        answer = question.get_correct_option_index() + 1 if question.is_quiz else question.answer
+        results = test_mode.grade_tests([("ann", [question.question_id], [answer]), ("bob", [question.question_id], ["wrong"])])
+        self.assertEqual([result["score"] for result in results], [1, 0])
+
+    def test_answer_matchers(self):
+        question = Question(True)
+        question.answer = "b"
+        question.answer_options = ["a", " B "]
+        self.assertEqual(question.get_correct_option_index(), 1)
+        question.answer = "A"
+        self.assertEqual(question.get_correct_option_index(), 0)    #cache follows the answer
+        free_form = Question()
+        free_form.set_answer("12")
+        self.assertTrue(free_form.compare_answers(" 012"))
+        self.assertFalse(free_form.compare_answers("twelve"))
+
+    def test_statistics_engine(self):
+        questions = []
+        for shown, correct in [(4, 1), (10, 9), (0, 0), (2, 2)]:
+            question = Question()
+            question.shown_count = shown
+            question.correct_count = correct
+            questions.append(question)
+        engine = StatisticsEngine(questions)
+        self.assertEqual(list(engine.hardest(2)), [0, 1])
+        self.assertEqual(list(engine.most_shown(1)), [1])
+        self.assertEqual(engine.histogram(bins=4), [0, 1, 0, 2])     #never shown questions are left out
+        self.assertEqual(engine.summary()["correct"], 12)
+
+    def test_lazy_loading(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file_paths = (os.path.join(directory, "questions.txt"), os.path.join(directory, "statistics.txt"))
+            with open(file_paths[0], 'w') as file:
+                file.write("1|True|1+1|2|FreeformQuestion\n2|True|2+2|3,4,5|4|QuizQuestion\n")
+            manager = QuestionManager(*file_paths, lazy=True)
+            question = manager.get_question_by_id(2)
+            self.assertFalse(question.is_slot_set("question_text"))      #nothing read yet
+            self.assertEqual(question.get_correct_option_index(), 1)
+            self.assertEqual(question.question_text, "2+2")
+
+            manager.set_question_enabled(manager.get_question_by_id(1), False)
+            manager.save_questions()                                     #questions move to the new file
+            self.assertEqual(manager.get_question_by_id(2).answer_options, ("3", "4", "5"))
+            self.assertEqual(str(manager.get_question_by_id(1)), "1|False|1+1|2|FreeformQuestion")
+            manager.storage.close()
+
+    def test_results_log(self):
+        with tempfile.TemporaryDirectory() as directory:
+            log = ResultsLog(os.path.join(directory, "results.jsonl"))
+            day = datetime.datetime(2024, 1, 1).timestamp()
+            for offset, percentage in enumerate([50.0, 100.0, 75.0]):
+                log.append(percentage, 1, 2, [(7, percentage == 100.0, 1.5)], timestamp=day + offset * 86400)
+            self.assertEqual([record["percentage"] for record in log.last_results(2)], [100.0, 75.0])
+            self.assertEqual(len(log.results_between(day + 1, day + 2 * 86400)), 1)
+            self.assertEqual(log.question_accuracy(7), (3, 1))
+            trend = ResultsLog(log.file_path).score_trend(datetime.date(2024, 1, 2), datetime.date(2024, 1, 3))
+            self.assertEqual([average for _, _, average in trend], [100.0, 75.0])
+
+    def test_server_sessions_are_per_learner(self):
+        manager = QuestionManager()
+        server = LearningServer(manager)
+        ann, bob = Connection(), Connection()
+        self.assertEqual(server.handle_command(ann, "HELLO ann"), "OK hello ann")
+        server.handle_command(bob, "HELLO bob")
+        question = server.handle_command(ann, "PRACTICE")
+        self.assertTrue(question.startswith("QUESTION"))
+        self.assertIn(server.handle_command(ann, "ANSWER 1").split()[0], ("CORRECT", "WRONG"))
+        self.assertEqual(server.handle_command(ann, "STATS"), "STATS shown 1 correct " + str(ann.learner.totals()[1]))
+        self.assertEqual(server.handle_command(bob, "STATS"), "STATS shown 0 correct 0")     #bob's state is separate
+        shown_before = [q.shown_count for q in manager.questions]
+        self.assertTrue(server.handle_command(bob, "TEST 5").startswith("QUESTION"))
+        for _ in range(5):
+            server.handle_command(bob, "ANSWER 1")
+            response = server.handle_command(bob, "NEXT")
+        self.assertTrue(response.startswith("SCORE"))
+        self.assertEqual([q.shown_count for q in manager.questions], shown_before)      #shared bank untouched
+
+    def test_learner_shards(self):
+        manager = QuestionManager()
+        with tempfile.TemporaryDirectory() as directory:
+            store = LearnerStore(directory)
+            ann = store.load("ann/smith", manager)
+            question = manager.questions[0]
+            ann.record_answer(question, True)
+            ann.record_answer(question, False)
+            ann.save()
+            self.assertEqual(os.path.dirname(os.path.dirname(store.shard_path("ann/smith"))), directory)
+            reloaded = store.load("ann/smith", manager)
+            self.assertEqual(reloaded.totals(), (2, 1))
+            self.assertAlmostEqual(reloaded.get_weight(question.question_id), 0.8 * 1.2)
+            bob = store.load("bob", manager)
+            bob.save()
+            self.assertEqual(bob.totals(), (0, 0))
+            self.assertFalse(os.path.exists(store.shard_path("bob")))       #nothing written for an unchanged learner
+            server = LearningServer(manager, store)
+            carl, carl_again = Connection(), Connection()
+            server.handle_command(carl, "HELLO carl")
+            server.handle_command(carl_again, "HELLO carl")
+            server.handle_command(carl, "PRACTICE")
+            server.handle_command(carl, "ANSWER 1")
+            self.assertEqual(len(carl.learner.sampler), 1)      #only answered questions get a weight of their own
+            server.handle_command(carl, "QUIT")
+            self.assertIn("carl", server.learners)      #still connected once
+            server.handle_command(carl_again, "QUIT")
+            self.assertNotIn("carl", server.learners)
+            self.assertEqual(store.load("carl", manager).totals()[0], 1)
+
+    def test_benchmark_report(self):
+        skipped = METRICS.counters.get("saves_skipped", 0)
+        report = benchmark.run_benchmarks(sizes=[60], draws=100, answers=20)
+        self.assertEqual(METRICS.counters.get("saves_skipped", 0), skipped)      #saves are timed, not skipped
+        names = [result["benchmark"] for result in report["results"]]
+        for name in ("load_questions", "load_statistics", "get_random_question", "practice_answer", "compare_answers", "save_questions", "save_statistics"):
+            self.assertIn(name, names)
+        self.assertTrue(all(result["size"] == 60 for result in report["results"]))
+
+    def test_metrics_format(self):
+        metrics = Metrics()
+        metrics.increment("answers")
+        metrics.increment("bytes_written", 120)
+        metrics.observe("question_selection", 0.00005)
+        metrics.observe("question_selection", 2.5)
+        text = metrics.format()
+        self.assertIn("quiz_answers_total 1\n", text)
+        self.assertIn("quiz_bytes_written_total 120\n", text)
+        self.assertIn('quiz_question_selection_seconds_bucket{le="0.0001"} 1\n', text)
+        self.assertIn('quiz_question_selection_seconds_bucket{le="+Inf"} 2\n', text)
+        self.assertIn("quiz_question_selection_seconds_count 2\n", text)
+
+    def test_background_statistics_writer(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, "questions.txt")
+            statistics_path = os.path.join(directory, "statistics.txt")
+            manager = QuestionManager(file_path, statistics_path)
+            manager.storage.writer.max_pending = 2
+            question = Question()
+            question.set_question_text("1+1")
+            question.set_answer("2")
+            manager.add_question_to_list(question)
+            for _ in range(2):
+                question.shown_count += 1
+                manager.record_answer(question)
+            deadline = time.time() + 5
+            while not os.path.exists(statistics_path) and time.time() < deadline:
+                time.sleep(0.01)     #written by the writer thread, without a save call
+            question.correct_count += 1
+            manager.record_answer(question)
+            manager.commit_changes()
+            with open(statistics_path) as file:
+                self.assertEqual(file.read().split('|')[3:5], ["2", "1"])
+            manager.storage.close()
+
+    def test_bulk_import_export(self):
+        with tempfile.TemporaryDirectory() as directory:
+            manager = QuestionManager(os.path.join(directory, "questions.txt"), os.path.join(directory, "statistics.txt"))
+            csv_path = os.path.join(directory, "in.csv")
+            with open(csv_path, 'w') as file:
+                file.write('question,answer,options,enabled\n1+1,2,,\n2+2,4,"3,4,5,6",false\nbad|text,1,,\n3+3,7,"5,6",\n')
+            with self.assertRaises(bulk.InvalidRecordsError) as context:
+                bulk.import_questions(manager, csv_path)
+            self.assertEqual(len(context.exception.errors), 2)     #separator in text, answer not an option
+            self.assertEqual(manager.questions, [])
+            with open(csv_path, 'w') as file:
+                file.write('question,answer,options,enabled\n1+1,2,,\n2+2,4,"3,4,5,6",false\n')
+            self.assertEqual(bulk.import_questions(manager, csv_path), 2)
+            self.assertEqual([q.question_id for q in manager.questions], [1, 2])
+            self.assertEqual(manager.questions[1].answer_options, ("3", "4", "5", "6"))
+            jsonl_path = os.path.join(directory, "out.jsonl")
+            bulk.export_questions(manager, jsonl_path)
+            copy = QuestionManager(os.path.join(directory, "copy.txt"), os.path.join(directory, "copy_statistics.txt"))
+            bulk.import_questions(copy, jsonl_path)
+            self.assertEqual([str(q) for q in copy.questions], [str(q) for q in manager.questions])
+            reloaded = QuestionManager(os.path.join(directory, "questions.txt"), os.path.join(directory, "statistics.txt"))
+            self.assertEqual(len(reloaded.questions), 2)
+
+    def test_snapshot_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, "questions.txt")
+            statistics_path = os.path.join(directory, "statistics.txt")
+            manager = QuestionManager(file_path, statistics_path)
+            manager.add_questions([Question(), Question(is_quiz=True)])
+            manager.questions[0].question_text, manager.questions[0].answer = "1+1", "2"
+            manager.questions[1].question_text, manager.questions[1].answer_options, manager.questions[1].answer = "2+2", ["3", "4"], "4"
+            manager.save_questions()
+            self.assertTrue(os.path.exists(file_path + ".cache"))
+            cached = QuestionManager(file_path, statistics_path)
+            self.assertEqual([str(q) for q in cached.questions], [str(q) for q in manager.questions])
+            self.assertTrue(cached.questions[1].check_answer("2"))
+            with open(file_path, 'a') as file:
+                file.write("3|True|3+3|6|FreeformQuestion\n")     #edited outside the program
+            self.assertEqual(len(QuestionManager(file_path, statistics_path).questions), 3)
+            manager.questions[1].answer_options = ["a, b", "4"]      #the separator inside an option does not survive the file
+            manager.save_questions()
+            cached = [q.cache_state() for q in QuestionManager(file_path, statistics_path).questions]
+            os.remove(file_path + ".cache")
+            parsed = [q.cache_state() for q in QuestionManager(file_path, statistics_path).questions]
+            self.assertEqual(cached, parsed)
+
+    def test_fuzzy_grading(self):
+        grader = FuzzyGrader()
+        question = Question()
+        question.set_answer("New York City")
+        self.assertTrue(grader.grade(question, "  new york,  city! "))
+        self.assertTrue(grader.grade(question, "New Yorc City"))      #one typo
+        self.assertTrue(grader.grade(question, "city new york"))
+        self.assertFalse(grader.grade(question, "Boston"))
+        self.assertTrue(grader.grade(question, "new york city"))
+        self.assertEqual((grader.hits, grader.misses), (1, 4))
+        question.set_answer("Boston")     #answer key fixed: cached results no longer apply
+        self.assertTrue(grader.grade(question, "Boston"))
+        number = Question()
+        number.set_answer("3.14")
+        self.assertTrue(FuzzyGrader(numeric_tolerance=0.01).grade(number, "3,141"))
+        self.assertFalse(FuzzyGrader(numeric_tolerance=0.01).grade(number, "3.2"))
+        self.assertFalse(grader.grade(number, "pi"))
+        negative = Question()
+        negative.set_answer("-3")
+        self.assertTrue(grader.grade(negative, "-3"))
+        self.assertFalse(grader.grade(negative, "3"))     #same normalized text, different number
+        number.set_answer("3.5")
+        self.assertTrue(grader.grade(number, "3.5"))
+        self.assertFalse(grader.grade(number, "3 5"))
+        quiz = Question(is_quiz=True)
+        quiz.answer_options = ["3", "4"]
+        quiz.answer = "4"
+        self.assertTrue(grader.grade(quiz, "2"))
+
+    def test_parallel_grading(self):
+        with tempfile.TemporaryDirectory() as directory:
+            manager = QuestionManager(os.path.join(directory, "questions.txt"), os.path.join(directory, "statistics.txt"))
+            questions = [Question(), Question(is_quiz=True)]
+            questions[0].set_answer("2")
+            questions[1].answer_options = ["3", "4"]
+            questions[1].answer = "4"
+            manager.add_questions(questions)
+            records = [("ann", 1, "2"), ("ann", 2, "2"), ("bob", 1, "3"), ("bob", 2, "1"), ("bob", 9, "1")] * 50
+            serial = batch_grading.grade_submissions(manager, records, workers=1, chunk_size=7)
+            parallel = batch_grading.grade_submissions(manager, records, workers=2, chunk_size=7, update_statistics=True)
+            self.assertEqual(serial, parallel)
+            self.assertEqual(serial[0], {"ann": (100, 100), "bob": (0, 100)})
+            self.assertEqual(serial[1], {1: (100, 50), 2: (100, 50)})
+            self.assertEqual(serial[2], 50)
+            self.assertEqual([q.shown_count for q in manager.questions], [100, 100])
+            file_path = os.path.join(directory, "questions.txt")
+            with open(file_path + ".log", 'w') as file:
+                file.write("enabled|1|Fal")      #torn entry from an interrupted session
+            if os.path.exists(file_path + ".cache"):
+                os.remove(file_path + ".cache")
+            batch_grading.load_worker_bank(file_path, manager.grader)
+            self.assertEqual(sorted(batch_grading.worker_questions), [1, 2])
+            with open(file_path + ".log") as file:
+                self.assertEqual(file.read(), "enabled|1|Fal")      #workers leave the bank files alone
+            self.assertFalse(os.path.exists(file_path + ".cache"))
+            for name in ("bank.qbank", "bank.db"):
+                path = os.path.join(directory, name)
+                exported = open_storage(path, os.path.join(directory, "statistics.txt"))
+                manager.export_bank(exported)
+                exported.close()
+                batch_grading.load_worker_bank(path, manager.grader)
+                self.assertEqual(batch_grading.worker_questions[2].answer, "4")
+
+    def test_search_index(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, "questions.txt")
+            manager = QuestionManager(file_path, os.path.join(directory, "statistics.txt"))
+            texts = ["What is the capital of France?", "Capital of Spain", "Largest planet"]
+            questions = []
+            for text in texts:
+                question = Question()
+                question.set_question_text(text)
+                question.set_answer("x")
+                questions.append(question)
+            manager.add_questions(questions)
+            self.assertEqual(manager.search_index.search("capital"), [1, 2])
+            self.assertEqual(manager.search_index.search("capital fr"), [1])     #last word as prefix
+            self.assertEqual(manager.search_index.search("capital fr", prefix=False), [])
+            duplicate = Question()
+            duplicate.set_question_text("what is the CAPITAL of france")
+            self.assertEqual(manager.search_index.find_duplicates(duplicate), [1])
+            quiz = Question(is_quiz=True)
+            quiz.set_question_text("Pick a planet")
+            quiz.add_option("Jupiter", is_correct=True)
+            manager.add_question_to_list(quiz)
+            self.assertEqual(manager.search_index.search("jup"), [4])     #options are indexed, and kept up to date
+            self.assertEqual(manager.set_enabled_by_query("capital", False), 2)
+            self.assertEqual(manager.enabled_count, 2)
+            reloaded = QuestionManager(file_path, os.path.join(directory, "statistics.txt"))
+            self.assertEqual([q.enabled for q in reloaded.questions], [False, False, True, True])
+
+
+    def test_tag_samplers(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, "questions.txt")
+            manager = QuestionManager(file_path, os.path.join(directory, "statistics.txt"))
+            questions = []
+            for index, tags in enumerate(["math", "math, algebra", "history", "", "history,math"]):
+                question = Question()
+                question.set_question_text(f"Question {index}")
+                question.set_answer("x")
+                question.set_tags(tags)
+                questions.append(question)
+            manager.add_questions(questions)
+            self.assertEqual(manager.get_tags(), ["algebra", "history", "math"])
+            self.assertEqual({manager.get_weighted_enabled_question("algebra").question_id for _ in range(20)}, {2})
+            self.assertEqual(manager.count_enabled(["algebra", "history"]), 3)
+            manager.set_question_enabled(questions[1], False)
+            self.assertIsNone(manager.get_weighted_enabled_question({"algebra": 1}))   #only topic disabled
+            self.assertEqual({manager.get_weighted_enabled_question({"algebra": 5, "history": 1}).question_id for _ in range(30)}, {3, 5})
+            self.assertEqual([q.question_id for q in manager.get_enabled_questions("math")], [1, 5])
+            for path in (file_path, os.path.join(directory, "bank.qbank"), os.path.join(directory, "bank.db")):
+                manager.export_bank(open_storage(path, os.path.join(directory, "statistics.txt")))
+                reloaded = QuestionManager(path, os.path.join(directory, "statistics.txt"))
+                self.assertEqual([q.tags for q in reloaded.questions], [("math",), ("math", "algebra"), ("history",), (), ("history", "math")])
+                reloaded.storage.close()
+            lazy = QuestionManager(file_path, os.path.join(directory, "statistics.txt"), lazy=True)
+            self.assertEqual(lazy.questions[4].tags, ("history", "math"))
+            self.assertEqual(lazy.questions[4].question_text, "Question 4")
+            lazy.storage.close()
+            with self.assertRaises(ValueError):
+                questions[0].set_tags("math, QuizQuestion")     #would read back as the question type
+            self.assertEqual(bulk.record_errors({"question": "q", "answer": "a", "options": [], "tags": ["FreeformQuestion"]}, True),
+                             ["tag FreeformQuestion is a question type name"])
+            mixed = QuestionManager(os.path.join(directory, "mixed.txt"), os.path.join(directory, "mixed_statistics.txt"), scheduler="leitner")
+            questions = []
+            for index in range(12):
+                question = Question()
+                question.set_question_text(f"Mixed {index}")
+                question.set_answer("x")
+                question.set_tags("history" if index % 3 == 0 else "math")
+                questions.append(question)
+            mixed.add_questions(questions)
+            math = {q.question_id for q in mixed.get_enabled_questions("math")}
+            forms = practice_test.TestMode(mixed).generate_tests(10, 4, seed=2, tags={"math": 3, "history": 1})
+            self.assertEqual([len(set(form) & math) for form in forms], [3] * 10)      #form split by share
+            self.assertIn(mixed.scheduler.next_question({"history": 1}).question_id, {1, 4, 7, 10})     #Leitner within the topic
+            mixed.storage.close()
+
+
+    def test_atomic_writes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, "questions.txt")
+            manager = QuestionManager(file_path, os.path.join(directory, "statistics.txt"))
+            question = Question()
+            question.set_question_text("1+1")
+            question.set_answer("2")
+            manager.add_question_to_list(question)
+            manager.save_questions()
+            checksum = persistence.FileChecksum(file_path)
+            self.assertEqual(checksum.generation(), 1)
+            manager.save_questions()
+            self.assertEqual(checksum.generation(), 1)      #unchanged save skipped
+            self.assertTrue(checksum.verify())
+            with self.assertRaises(RuntimeError):
+                with persistence.atomic_open(file_path) as file:
+                    file.write("torn")
+                    raise RuntimeError("interrupted")
+            self.assertEqual(os.listdir(directory).count("questions.txt"), 1)
+            self.assertEqual(QuestionManager(file_path, os.path.join(directory, "statistics.txt")).questions[0].question_text, "1+1")
+            with open(file_path, 'a') as file:
+                file.write("edited")
+            self.assertFalse(checksum.verify())
+            manager.save_questions()      #edited on disk, so written again
+            self.assertEqual(checksum.generation(), 2)
+            self.assertFalse(any(name.endswith(".tmp") for name in os.listdir(directory)))
+
 
 if __name__ == '__main__':
     unittest.main()